@@ -0,0 +1,253 @@
+"""A local stand-in for the parts of the reddit API the bot uses.
+
+Responses are built from the ones recorded in ``test/cassettes``, scaled up
+with synthetic data: the report listing is filled with generated posts, and
+wiki pages hold whatever content the benchmark seeds them with, with a
+revision per edit. ``/api/info`` serves the generated posts and the
+subreddit.
+No rate limit headers are sent, so prawcore never waits.
+
+"""
+import json
+import re
+import socketserver
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+CASSETTES = Path(__file__).resolve().parent.parent / "test" / "cassettes"
+
+
+def _recorded(cassette, method, pattern):
+    """Return the decoded response body of a recorded interaction."""
+    with (CASSETTES / "{}.json".format(cassette)).open() as file:
+        interactions = json.load(file)["http_interactions"]
+    for interaction in interactions:
+        request = interaction["request"]
+        if request["method"] == method and re.search(pattern, request["uri"]):
+            return json.loads(interaction["response"]["body"]["string"])
+    raise LookupError("{}: no {} {}".format(cassette, method, pattern))
+
+
+def to_base36(number):
+    """Return number in base 36, as in reddit ids."""
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    result = ""
+    while True:
+        number, digit = divmod(number, 36)
+        result = digits[digit] + result
+        if not number:
+            return result
+
+
+class FakeReddit:
+    """The state served by a FakeRedditServer."""
+
+    def __init__(self, commands, mods, authors=1000, first_id=10**8):
+        """Initialize the FakeReddit class."""
+        self.commands = commands
+        self.mods = mods
+        self.authors = authors
+        self.next_id = first_id
+        self.reports = 0
+        self.partial = 0
+        self.pages = {}
+        self.requests = {}
+        self._lock = threading.Lock()
+
+        self.token = _recorded("TestRemoval.system", "POST", "access_token")
+        self.about = _recorded("TestRemoval.system", "GET", r"/about/\?")
+        self.moderators = _recorded(
+            "TestRemoval.system", "GET", "/about/moderators"
+        )
+        listing = _recorded("TestRemoval.system", "GET", "/about/reports")
+        self.listing = listing
+        self.post = listing["data"]["children"][0]
+        self.revision = _recorded(
+            "TestUsernote.system", "GET", "/wiki/revisions/usernotes"
+        )
+        self.page = _recorded(
+            "TestUsernote.system", "GET", r"/wiki/usernotes\?"
+        )
+        self.comment = _recorded("TestNotifier.system", "POST", "/comment")
+
+    @property
+    def subreddit(self):
+        """Return the name of the subreddit in the recordings."""
+        return self.about["data"]["display_name"]
+
+    def set_page(self, name, content):
+        """Add a revision of the wiki page name, holding content."""
+        with self._lock:
+            self.pages.setdefault(name, []).append(content)
+
+    def _listing(self, children):
+        listing = dict(self.listing)
+        listing["data"] = dict(listing["data"], children=children, after=None)
+        return listing
+
+    def _post(self, number):
+        post_id = to_base36(number)
+        data = dict(self.post["data"])
+        data.update(
+            id=post_id,
+            name="t3_" + post_id,
+            author="user{}".format(number % self.authors),
+            permalink="/r/{}/comments/{}/post/".format(
+                self.subreddit, post_id
+            ),
+            mod_reports=[
+                [
+                    self.commands[number % len(self.commands)],
+                    self.mods[number % len(self.mods)],
+                ]
+            ],
+        )
+        return {"kind": "t3", "data": data}
+
+    def new_reports(self, count):
+        """Return a listing of count newly reported posts.
+
+        The first ``partial`` posts lack their author and permalink, as
+        items from other listings might, so that they must be hydrated.
+
+        """
+        with self._lock:
+            first_id, self.next_id = self.next_id, self.next_id + count
+        children = [
+            self._post(number) for number in range(first_id, first_id + count)
+        ]
+        for child in children[: self.partial]:
+            del child["data"]["author"], child["data"]["permalink"]
+        return self._listing(children)
+
+    def info(self, query):
+        """Return the /api/info listing of posts or subreddits in query."""
+        children = []
+        for fullname in query.get("id", [""])[0].split(","):
+            if fullname.startswith("t3_"):
+                children.append(self._post(int(fullname[3:], 36)))
+        for name in query.get("sr_name", [""])[0].split(","):
+            if name.casefold() == self.subreddit.casefold():
+                children.append(self.about)
+        return self._listing(children)
+
+    def wiki_revisions(self, name, limit=25):
+        """Return the revision listing of the wiki page name, newest first."""
+        with self._lock:
+            count = len(self.pages.get(name, ()))
+        children = []
+        for number in range(count, max(count - limit, 0), -1):
+            revision = dict(self.revision["data"]["children"][0])
+            revision.update(id="rev-{}".format(number), page=name)
+            children.append(revision)
+        listing = dict(self.revision)
+        listing["data"] = dict(listing["data"], children=children)
+        return listing
+
+    def wiki_page(self, name, revision_id=None):
+        """Return the wiki page name, at revision_id or the newest one."""
+        with self._lock:
+            history = self.pages.get(name, [""])
+        content = history[-1]
+        if revision_id is not None:
+            content = history[int(revision_id.split("-")[1]) - 1]
+        page = dict(self.page)
+        page["data"] = dict(page["data"], content_md=content)
+        return page
+
+    def count(self, method, path):
+        """Count a request to path, with ids replaced by a placeholder."""
+        key = "{} {}".format(method, re.sub(r"/r/[^/]+", "/r/{sub}", path))
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send each response in one write, without waiting on delayed ACKs
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def _reply(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _form(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return urllib.parse.parse_qs(self.rfile.read(length).decode())
+
+    def do_GET(self):  # noqa: N802
+        reddit = self.server.reddit
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.rstrip("/")
+        query = urllib.parse.parse_qs(url.query)
+        reddit.count("GET", path)
+        if path == "/api/info":
+            return self._reply(reddit.info(query))
+        match = re.fullmatch(r"/r/[^/]+/wiki/revisions/(.+)", path)
+        if match:
+            limit = int(query.get("limit", [25])[0])
+            return self._reply(reddit.wiki_revisions(match.group(1), limit))
+        match = re.fullmatch(r"/r/[^/]+/wiki/(.+)", path)
+        if match:
+            revision_id = query.get("v", [None])[0]
+            return self._reply(reddit.wiki_page(match.group(1), revision_id))
+        if path.endswith("/about/reports"):
+            return self._reply(reddit.new_reports(reddit.reports))
+        if path.endswith("/about/moderators"):
+            return self._reply(reddit.moderators)
+        if path.endswith("/about"):
+            return self._reply(reddit.about)
+        return self._reply({"error": 404}, 404)
+
+    def do_POST(self):  # noqa: N802
+        reddit = self.server.reddit
+        path = urllib.parse.urlsplit(self.path).path.rstrip("/")
+        form = self._form()
+        reddit.count("POST", path)
+        if path.endswith("/access_token"):
+            return self._reply(reddit.token)
+        if path.endswith("/api/wiki/edit"):
+            reddit.set_page(form["page"][0], form["content"][0])
+            return self._reply({})
+        if path.endswith("/api/comment") or path.endswith("/api/distinguish"):
+            return self._reply(reddit.comment)
+        return self._reply({})
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeRedditServer(socketserver.ThreadingMixIn, HTTPServer):
+    """An HTTP server for a FakeReddit, on a free local port."""
+
+    daemon_threads = True
+
+    def __init__(self, reddit):
+        """Initialize the FakeRedditServer class."""
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.reddit = reddit
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="fake-reddit", daemon=True
+        )
+
+    @property
+    def url(self):
+        """Return the base URL of the server."""
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def __enter__(self):
+        """Start serving from a background thread."""
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop serving."""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,238 @@
+"""Replay synthetic report listings through Browser.run, offline.
+
+Usage: python -m benchmarks.replay [--reports N] [--rules N] [--cycles N]
+                                   [--usernotes N] [--automod-entries N]
+                                   [--partial N]
+
+Each cycle, the fake reddit reports that many new posts, spread across the
+rules' commands, of which ``partial`` lack attributes and are hydrated. The
+subreddit tables are synced as at startup, through ``/api/info``. The
+benchmark prints the throughput of each cycle, the time
+spent in each traced stage, the database commit cost, and the requests made.
+
+"""
+import argparse
+import copy
+import json
+import os
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import praw
+
+from bernard import db, helpers, loader, metrics, schema, tracing
+from bernard.actors import ToolboxNoteAdderActionBuffer
+from bernard.user_cache import UserIdCache
+
+from .fake_reddit import FakeReddit, FakeRedditServer
+
+MODS = ["mod_a", "mod_b", "mod_c"]
+PLACEHOLDER = "do!not!remove!watchlist"
+
+_ACTIONS = [
+    ["remove"],
+    ["remove", {"usernote": {"text": "Rule 1", "level": "abusewarn"}}],
+    [{"userwatch": {"placeholder": PLACEHOLDER}}],
+    [{"notify": {"text": "Please keep our rules in mind!"}}, "remove"],
+]
+
+
+class StageStats(tracing.Hook):
+    """A tracing hook that totals the time spent in each stage."""
+
+    def __init__(self):
+        """Initialize the StageStats class."""
+        self.stages = {}
+
+    def end(self, span):
+        """Add span to the totals of its stage."""
+        count, total, longest = self.stages.get(span.name, (0, 0, 0))
+        self.stages[span.name] = (
+            count + 1,
+            total + span.duration,
+            max(longest, span.duration),
+        )
+
+
+def rule_configs(rules):
+    """Return rule configurations for rules rules, one command each."""
+    return [
+        {
+            "info": {"name": "Rule {}".format(number), "details": None},
+            "trigger": {
+                "commands": ["c{}".format(number)],
+                "types": ["post", "comment"],
+            },
+            # The loader adds the action buffer to the actors' parameters
+            "actions": copy.deepcopy(_ACTIONS[number % len(_ACTIONS)]),
+        }
+        for number in range(rules)
+    ]
+
+
+def usernotes_page(users):
+    """Return a usernotes page with a note on each of users users."""
+    now = int(time.time())
+    notes = {
+        "user{}".format(number): {
+            "ns": [{"n": "Note", "t": now, "m": 0, "l": "", "w": 1}]
+        }
+        for number in range(users)
+    }
+    return json.dumps(
+        {
+            "ver": 6,
+            "constants": {"users": [MODS[0]], "warnings": [None, "abusewarn"]},
+            "blob": ToolboxNoteAdderActionBuffer.compress_blob(notes),
+        }
+    )
+
+
+def automod_page(entries):
+    """Return an AutoMod configuration with entries in the watchlist."""
+    listed = ", ".join(
+        [PLACEHOLDER] + ["listed{}".format(n) for n in range(entries)]
+    )
+    rule = "---\ntitle (includes): [spam{}]\naction: filter\n"
+    return "author: [{}]\naction: report\n".format(listed) + "".join(
+        rule.format(number) for number in range(100)
+    )
+
+
+def run(
+    reports=1000,
+    rules=100,
+    cycles=3,
+    usernotes=1000,
+    automod_entries=0,
+    partial=0,
+):
+    """Run the benchmark and return its results as a dict."""
+    fake = FakeReddit(["c{}".format(n) for n in range(rules)], MODS)
+    fake.partial = partial
+    fake.set_page("usernotes", usernotes_page(usernotes))
+    fake.set_page("config/automoderator", automod_page(automod_entries))
+    stats = StageStats()
+    tracing.add_hook(stats)
+    commits_before = metrics.DB_COMMIT_SECONDS.value() or (0, 0)
+
+    with FakeRedditServer(fake) as server, tempfile.TemporaryDirectory() as d:
+        reddit = praw.Reddit(
+            client_id="benchmark",
+            client_secret="benchmark",
+            username="benchmark",
+            password="benchmark",
+            user_agent="bernard replay benchmark",
+            oauth_url=server.url,
+            reddit_url=server.url,
+            requestor_class=metrics.InstrumentedRequestor,
+        )
+        database_path = os.path.join(d, "bernard.db")
+        database = db.Database.open(database_path)
+        schema.migrate(database.writer)
+
+        # Rule.log_action prints every action
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            start = time.perf_counter()
+            user_ids = UserIdCache()
+            browser = loader.parse_subreddit_config(
+                database,
+                reddit.subreddit(fake.subreddit),
+                rule_configs(rules),
+                user_ids,
+                sync_tables=False,
+            )
+            infos = helpers.fetch_sr_infos(reddit, [browser.subreddit])
+            with database.write() as cursor:
+                for info in infos:
+                    helpers.write_sr_tables(cursor, info, user_ids)
+            load_time = time.perf_counter() - start
+
+            fake.reports = reports
+            cycle_times = []
+            for _ in range(cycles):
+                start = time.perf_counter()
+                browser.run()
+                cycle_times.append(time.perf_counter() - start)
+        database_size = sum(
+            os.path.getsize(path)
+            for path in (database_path, database_path + "-wal")
+            if os.path.exists(path)
+        )
+        database.writer.close()
+
+    tracing.remove_hook(stats)
+    commits_after = metrics.DB_COMMIT_SECONDS.value()
+    return {
+        "load_seconds": load_time,
+        "cycle_seconds": cycle_times,
+        "reports_per_second": [reports / seconds for seconds in cycle_times],
+        "stages": stats.stages,
+        "db_commits": commits_after[0] - commits_before[0],
+        "db_commit_seconds": commits_after[1] - commits_before[1],
+        "db_bytes": database_size,
+        "requests": fake.requests,
+    }
+
+
+def report(results):
+    """Print results in a readable form."""
+    print("Loaded config in {:.3f} s".format(results["load_seconds"]))
+    for number, (seconds, rate) in enumerate(
+        zip(results["cycle_seconds"], results["reports_per_second"]), 1
+    ):
+        print(
+            "Cycle {}: {:.3f} s, {:.0f} reports/s".format(
+                number, seconds, rate
+            )
+        )
+    print(
+        "\n{:<16}{:>10}{:>12}{:>12}{:>12}".format(
+            "stage", "count", "total s", "mean ms", "max ms"
+        )
+    )
+    for name, (count, total, longest) in sorted(
+        results["stages"].items(), key=lambda item: -item[1][1]
+    ):
+        print(
+            "{:<16}{:>10}{:>12.3f}{:>12.3f}{:>12.3f}".format(
+                name, count, total, 1000 * total / count, 1000 * longest
+            )
+        )
+    print(
+        "\nDatabase: {} commits, {:.3f} s, {} bytes".format(
+            results["db_commits"],
+            results["db_commit_seconds"],
+            results["db_bytes"],
+        )
+    )
+    print("\nRequests:")
+    for key, count in sorted(results["requests"].items()):
+        print("{:>8}  {}".format(count, key))
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=1000)
+    parser.add_argument("--rules", type=int, default=100)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--usernotes", type=int, default=1000)
+    parser.add_argument("--automod-entries", type=int, default=0)
+    parser.add_argument("--partial", type=int, default=0)
+    args = parser.parse_args()
+    report(
+        run(
+            args.reports,
+            args.rules,
+            args.cycles,
+            args.usernotes,
+            args.automod_entries,
+            args.partial,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
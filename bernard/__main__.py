@@ -1,16 +1,17 @@
 """Entry point for the bot."""
 import logging
-import sqlite3
 import sys
-import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import praw
-import prawcore
 
-from . import helpers
+from . import db, helpers, metrics, schema, tracing
+from .browser import MultiredditFetcher
 from .discord_notifier import DiscordHandler
-from .loader import load_yaml_config
+from .loader import ConfigWatcher, load_yaml_config
+from .scheduler import Scheduler
+from .user_cache import UserIdCache
 
 USER_AGENT = "python:/r/Philosophy reporter:v0.4.0 (by levimroth@gmail.com)"
 
@@ -23,46 +24,74 @@ def main():
     # pylint: disable=unbalanced-tuple-unpacking
     _, conf_dir, db_file = sys.argv
 
-    reddit = praw.Reddit(user_agent=USER_AGENT)
-    database = sqlite3.connect(db_file)
-    cursor = database.cursor()
+    reddit = praw.Reddit(
+        user_agent=USER_AGENT, requestor_class=metrics.InstrumentedRequestor
+    )
 
     logging.basicConfig()
     logging.raiseExceptions = False
     webhook = reddit.config.custom["discord_webhook"]
-    webhook_logger = DiscordHandler(webhook, level=logging.ERROR)
+    webhook_logger = DiscordHandler(
+        webhook,
+        level=logging.ERROR,
+        interval=helpers.setting(reddit, "discord_interval", 2.0),
+    )
     logging.getLogger().addHandler(webhook_logger)
 
-    browsers = []
-    for config_file in Path(conf_dir).glob("*/bernard-config.yaml"):
+    if helpers.setting(reddit, "tracing", False):
+        tracing.enable()
+
+    metrics_port = helpers.setting(reddit, "metrics_port", 0)
+    if metrics_port:
+        metrics.serve(metrics_port)
+    metrics_file = helpers.setting(reddit, "metrics_file", "")
+    if metrics_file:
+        metrics.dump_every(
+            metrics_file, helpers.setting(reddit, "metrics_interval", 15.0)
+        )
+
+    database = db.Database.open(db_file)
+    schema.migrate(database.writer)
+    user_ids = UserIdCache()
+    user_ids.warm(database.reader.cursor())
+
+    def load(config_file):
         sub_name, _ = config_file.parts[-2:]
         subreddit = reddit.subreddit(sub_name)
-        browsers.append(load_yaml_config(database, subreddit, config_file))
-    database.commit()
+        # The subreddit tables are synced by the Scheduler instead
+        return load_yaml_config(
+            database, subreddit, config_file, user_ids, sync_tables=False
+        )
+
+    paths = sorted(Path(conf_dir).glob("*/bernard-config.yaml"))
+    with ThreadPoolExecutor() as executor:
+        config_files = dict(zip(executor.map(load, paths), paths))
+    browsers = list(config_files)
 
     print("Loaded")
 
-    counter = 0
-    while True:
-        try:
-            for browser in browsers:
-                browser.run()
-            if counter == 20:
-                for browser in browsers:
-                    try:
-                        helpers.update_sr_tables(cursor, browser.subreddit)
-                    except prawcore.PrawcoreException as exception:
-                        logging.error(exception)
-                        database.rollback()
-                    else:
-                        database.commit()
-                counter = 0
-            else:
-                counter += 1
-            time.sleep(30)
-        except KeyboardInterrupt:
-            print("Keyboard interrupt; shutting down...")
-            break
+    watcher = None
+    reload_interval = helpers.setting(reddit, "config_reload_interval", 5.0)
+    if reload_interval:
+        watcher = ConfigWatcher(config_files, reload_interval)
+    fetcher = None
+    if helpers.setting(reddit, "multireddit_reports", False):
+        fetcher = MultiredditFetcher(reddit)
+    scheduler = Scheduler(
+        browsers,
+        min_interval=helpers.setting(reddit, "poll_min_interval", 10.0),
+        max_interval=helpers.setting(reddit, "poll_max_interval", 60.0),
+        backoff=helpers.setting(reddit, "poll_backoff", 2.0),
+        fetcher=fetcher,
+        rate_limiter=helpers.rate_limiter(reddit),
+        user_ids=user_ids,
+        watcher=watcher,
+    )
+    scheduler.request_refresh(browsers)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        print("Keyboard interrupt; shutting down...")
 
 
 main()
@@ -0,0 +1,73 @@
+"""Provide the ActionLog class."""
+from . import db
+from .user_cache import UserIdCache
+
+
+class ActionLog:
+    """A write-behind log of the actions taken by Rules.
+
+    Actions are kept in memory until ``flush`` writes them with a single
+    ``executemany``, as part of the caller's transaction. With
+    ``autoflush``, every action is written in a transaction of its own as
+    soon as it is recorded.
+
+    """
+
+    def __init__(self, database, autoflush=False, user_ids=None):
+        """Initialize the ActionLog class."""
+        self.database = db.wrap(database)
+        self.autoflush = autoflush
+        self.pending = []
+        self.user_ids = UserIdCache() if user_ids is None else user_ids
+        # Ids of users created in a rolled back transaction may be reused
+        self.database.on_rollback(self.user_ids.clear)
+        self._pending_keys = set()
+
+    def contains(self, target_type, target_id, moderator):
+        """Return True if an unflushed action matches target and moderator."""
+        return (target_type, target_id, moderator) in self._pending_keys
+
+    def record(
+        self,
+        target_type,
+        target_id,
+        action_summary,
+        action_details,
+        author,
+        moderator,
+        subreddit,
+    ):
+        """Add an action to the log."""
+        self.pending.append(
+            (
+                target_type,
+                target_id,
+                action_summary,
+                action_details,
+                author,
+                moderator,
+                subreddit,
+            )
+        )
+        self._pending_keys.add((target_type, target_id, moderator))
+        if self.autoflush:
+            with self.database.write() as cursor:
+                self.flush(cursor)
+
+    def flush(self, cursor):
+        """Write pending actions with cursor, without committing."""
+        if not self.pending:
+            return
+        usernames = {name for row in self.pending for name in row[4:6]}
+        user_ids = self.user_ids.get_many(cursor, usernames)
+        cursor.executemany(
+            "INSERT INTO actions (target_type, target_id, action_summary, "
+            "action_details, author, moderator, subreddit) "
+            "VALUES(?,?,?,?,?,?,?)",
+            [
+                row[:4] + (user_ids[row[4]], user_ids[row[5]], row[6])
+                for row in self.pending
+            ],
+        )
+        self.pending.clear()
+        self._pending_keys.clear()
@@ -1,28 +1,51 @@
 """Classes that carry out specific actions on posts and comments."""
 import base64
+import functools
 import json
 import logging
+import math
+import threading
 import time
 import urllib.parse
 import zlib
 from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
 from xml.sax.saxutils import unescape
 
 import praw
 import prawcore
 import prawdditions  # NOQA
 
-from . import helpers
+from . import automod, db, helpers, metrics, tracing
+from .action_log import ActionLog
+
+_Step = namedtuple("_Step", "name function runs_after concurrent")
 
 
 class Rule:
     """A class for managing rules.
 
     Responsible for matching input with commands, performing the requested
-    actions, and logging to database.
+    actions, and logging to database. Actions are logged through
+    ``action_log``; without one, each action is written immediately.
 
     """
 
+    # Served by the actions_target_moderator index and the unique index on
+    # users.username; the statement is prepared once per connection.
+    ALREADY_ACTED_QUERY = (
+        "SELECT EXISTS (SELECT 1 FROM actions "
+        "WHERE target_type = ? AND target_id = ? AND moderator = "
+        "(SELECT id FROM users WHERE username = ?))"
+    )
+
+    # Ordering constraints of the removal, approval and lock steps; those of
+    # actors are in Actor.RUNS_AFTER
+    RUNS_AFTER = {"lock": ("remove",)}
+
+    _executor = None
+    _pool_lock = threading.Lock()
+
     def __init__(
         self,
         commands,
@@ -34,8 +57,9 @@ class Rule:
         action_details,
         database,
         subreddit,
+        action_log=None,
     ):
-        """Initialize the Actor class."""
+        """Initialize the Rule class."""
         self.commands = commands
         self.targets = targets
         self.remove = remove
@@ -43,34 +67,26 @@ class Rule:
         self.actors = actors
         self.action_name = action_name
         self.action_details = action_details
-        self.database = database
-        self.cursor = database.cursor()
+        self.database = db.wrap(database)
         self.subreddit = subreddit
+        if action_log is None:
+            action_log = ActionLog(self.database, autoflush=True)
+        self.action_log = action_log
+        # pylint: disable=protected-access
+        self.workers = helpers.setting(subreddit._reddit, "actor_workers", 0)
 
     def _already_acted(self, fullname, mod):
         target_type, target_id = helpers.deserialize_thing_id(fullname)
+        if self.action_log.contains(target_type, target_id, str(mod)):
+            return True
 
-        self.cursor.execute(
-            "SELECT 1 FROM actions INNER JOIN users "
-            "ON actions.moderator = users.id "
-            "WHERE target_type = ? AND target_id = ? "
-            "AND users.username = ?",
-            (target_type, target_id, str(mod)),
+        cursor = self.database.reader.execute(
+            self.ALREADY_ACTED_QUERY, (target_type, target_id, str(mod))
         )
-        result = self.cursor.fetchone() is not None
-
+        result = bool(cursor.fetchone()[0])
         if result:
             # Logging to see where we act on the same thing twice
-            self.cursor.execute(
-                "SELECT users.username FROM actions "
-                "INNER JOIN users "
-                "ON actions.moderator = users.id "
-                "WHERE target_type = ? AND target_id = ?",
-                (target_type, target_id),
-            )
-            previous = self.cursor.fetchall()
-            if len(previous) > 0:
-                logging.info("Saw repeated actions on %s", fullname)
+            logging.info("Saw repeated actions on %s", fullname)
 
         return result
 
@@ -83,36 +99,129 @@ class Rule:
     def parse(self, command, mod, post):
         """Execute requested actions if report matches command."""
         if self.match(command, post):
-            # Only act once on a given thing
+            self.execute(mod, post)
+
+    def execute(self, mod, post):
+        """Execute requested actions on a report already known to match.
+
+        Return True if the actions were carried out.
+
+        """
+        subreddit = str(self.subreddit)
+        metrics.RULES_MATCHED.inc(subreddit=subreddit, rule=self.action_name)
+        # Only act once on a given thing
+        with tracing.span(
+            "already_acted", subreddit=subreddit, rule=self.action_name
+        ):
             if self._already_acted(post.fullname, mod):
-                return
+                return False
 
+        with tracing.span(
+            "log_action", subreddit=subreddit, rule=self.action_name
+        ):
             self.log_action(post, mod)
 
-            for actor in self.actors:
-                actor.action(post, mod)
+        steps = self._steps(mod, post)
+        if self.workers:
+            self._run_concurrently(steps)
+        else:
+            for step in steps:
+                step.function()
 
-            if self.remove:
-                try:
-                    post.mod.remove()
-                except prawcore.PrawcoreException as exception:
-                    logging.error("Failed to remove %s: %s", post, exception)
-            else:
-                try:
-                    post.mod.approve()
-                except prawcore.PrawcoreException as exception:
-                    logging.error("Failed to approve %s: %s", post, exception)
+        return True
 
-            if self.lock and isinstance(post, praw.models.Submission):
-                try:
-                    post.mod.lock()
-                except prawcore.PrawcoreException as exception:
-                    logging.error("Failed to lock %s: %s", post, exception)
+    def _act(self, actor, mod, post):
+        name = type(actor).__name__
+        subreddit = str(self.subreddit)
+        with tracing.span(
+            "action", subreddit=subreddit, rule=self.action_name, actor=name
+        ):
+            actor.action(post, mod)
+        metrics.ACTIONS.inc(subreddit=subreddit, actor=name)
 
-            self.database.commit()
+    def _moderate(self, post, name):
+        try:
+            getattr(post.mod, name)()
+            metrics.ACTIONS.inc(subreddit=str(self.subreddit), actor=name)
+        except prawcore.PrawcoreException as exception:
+            logging.error("Failed to %s %s: %s", name, post, exception)
+
+    def _steps(self, mod, post):
+        """Return the steps of acting on post, in their serial order."""
+        steps = [
+            _Step(
+                type(actor).__name__,
+                functools.partial(self._act, actor, mod, post),
+                actor.RUNS_AFTER,
+                actor.CONCURRENT,
+            )
+            for actor in self.actors
+        ]
+        moderation = ["remove" if self.remove else "approve"]
+        if self.lock and isinstance(post, praw.models.Submission):
+            moderation.append("lock")
+        for name in moderation:
+            steps.append(
+                _Step(
+                    name,
+                    functools.partial(self._moderate, post, name),
+                    self.RUNS_AFTER.get(name, ()),
+                    True,
+                )
+            )
+        return steps
+
+    @staticmethod
+    def _waves(steps):
+        """Split steps into waves that only follow steps of earlier waves."""
+        names = {step.name for step in steps}
+        done = set()
+        waves = []
+        while steps:
+            wave = [
+                step
+                for step in steps
+                if all(
+                    name in done or name not in names
+                    for name in step.runs_after
+                )
+            ]
+            if not wave:
+                raise RuntimeError("Circular ordering of actions")
+            waves.append(wave)
+            done.update(step.name for step in wave)
+            steps = [step for step in steps if step not in wave]
+        return waves
+
+    def _run_concurrently(self, steps):
+        """Run steps on the shared pool, wave by wave.
+
+        Steps that aren't ``concurrent`` run on the calling thread.
+
+        """
+        pool = self._pool(self.workers)
+        for wave in self._waves(steps):
+            futures = [
+                pool.submit(step.function) for step in wave if step.concurrent
+            ]
+            for step in wave:
+                if not step.concurrent:
+                    step.function()
+            wait(futures)
+            for future in futures:
+                future.result()
+
+    @classmethod
+    def _pool(cls, workers):
+        with cls._pool_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="actor"
+                )
+            return cls._executor
 
     def log_action(self, target, moderator):
-        """Log action in database and console. Return database row id."""
+        """Log action in database and console."""
         target_type, target_id = helpers.deserialize_thing_id(target.fullname)
         action_summary = self.action_name
         action_details = self.action_details
@@ -123,38 +232,16 @@ class Rule:
         else:
             author_name = target.author.name
 
-        # Get (or create) database entries for author and moderator
-        self.cursor.execute(
-            "INSERT OR IGNORE INTO users (username) " "VALUES(?)",
-            (author_name,),
-        )
-        self.cursor.execute(
-            "SELECT id FROM users WHERE username = ?", (author_name,)
-        )
-        author_id = self.cursor.fetchone()[0]
-        self.cursor.execute(
-            "INSERT OR IGNORE INTO users (username) " "VALUES(?)", (moderator,)
-        )
-        self.cursor.execute(
-            "SELECT id FROM users WHERE username = ?", (moderator,)
-        )
-        moderator_id = self.cursor.fetchone()[0]
-
         _, subreddit = helpers.deserialize_thing_id(self.subreddit.fullname)
 
-        self.cursor.execute(
-            "INSERT INTO actions (target_type, target_id, action_summary, "
-            "action_details, author, moderator, subreddit) "
-            "VALUES(?,?,?,?,?,?,?)",
-            (
-                target_type,
-                target_id,
-                action_summary,
-                action_details,
-                author_id,
-                moderator_id,
-                subreddit,
-            ),
+        self.action_log.record(
+            target_type,
+            target_id,
+            action_summary,
+            action_details,
+            author_name,
+            str(moderator),
+            subreddit,
         )
 
         print(
@@ -165,20 +252,46 @@ class Rule:
 class ActionBuffer:  # pylint: disable=too-few-public-methods
     """Abstract class for managing buffered updates."""
 
-    def __init__(self, subreddit):
+    def __init__(self, subreddit, database=None):
         """Initialize the ActionBuffer class."""
         self.subreddit = subreddit
+        self.database = None if database is None else db.wrap(database)
 
     def after(self):
         """Perform actions on buffer."""
         raise NotImplementedError
 
+    def backlog(self):
+        """Return the number of items that drain would work through."""
+        return 0
+
+    def depth(self):
+        """Return the number of items waiting in the buffer."""
+        return self.backlog()
+
+    def drain(self):
+        """Work through part of the backlog between polling cycles.
+
+        Return True if a backlog remains.
+
+        """
+        return False
+
 
 class Actor:
-    """Base class for specific actions the bot can perform."""
+    """Base class for specific actions the bot can perform.
+
+    With the ``actor_workers`` setting, a Rule runs its actors concurrently.
+    ``RUNS_AFTER`` names the steps, i.e. actor classes or "remove",
+    "approve" and "lock", that must be done before this actor starts.
+    Actors that are not ``CONCURRENT`` run on the Rule's own thread.
+
+    """
 
     REQUIRED_TYPES = {}
     VALID_TARGETS = []
+    RUNS_AFTER = ()
+    CONCURRENT = True
 
     @classmethod
     def validate_params(cls, params):
@@ -245,6 +358,7 @@ class Banner(Actor):
 class Locker(Actor):
     """Locks posts, without necessarily removing them."""
 
+    RUNS_AFTER = ("remove",)
     VALID_TARGETS = [praw.models.Submission]
 
     def action(self, post, mod):
@@ -321,27 +435,228 @@ class Notifier(Actor):
 
 
 class NukerActionBuffer(ActionBuffer):
-    """A buffer for enqueued comment removals."""
+    """A buffer for enqueued comment removals.
+
+    Comment trees are expanded on a thread pool shared by all buffers. Each
+    ``MoreComments`` is fetched as its own task, and replies are queued for
+    removal as soon as they are found.
+
+    Comments are removed in batches, after each cycle and between cycles.
+    A batch holds at most ``nuke_batch_size`` comments (a praw.ini setting),
+    and no more than a share of the remaining rate limit budget, so that
+    polling for new commands is never starved.
+
+    If ``nuke_watch_hours`` is set, nuked subtrees are remembered for that
+    long. Each cycle, the subreddit's comment stream is read, and new
+    comments whose parent is in a remembered subtree are queued as well.
+
+    """
+
+    BUDGET_SHARE = 0.25
+    EXPANSION_WAIT = 5
+    EXPANSION_WORKERS = 4
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._executor_lock:
+            if NukerActionBuffer._executor is None:
+                NukerActionBuffer._executor = ThreadPoolExecutor(
+                    max_workers=cls.EXPANSION_WORKERS
+                )
+            return NukerActionBuffer._executor
+
+    @staticmethod
+    def _flatten(items):
+        """Generate items and, recursively, the replies of comments."""
+        queue = deque(items)
+        while queue:
+            item = queue.popleft()
+            yield item
+            if isinstance(item, praw.models.Comment):
+                queue.extend(item.replies)
 
     def __init__(self, *args, **kwargs):
         """Initialize the NukerActionBuffer class."""
         super().__init__(*args, **kwargs)
         self.actions = deque()
+        # pylint: disable=protected-access
+        self.reddit = self.subreddit._reddit
+        self.batch_size = helpers.setting(self.reddit, "nuke_batch_size", 30)
+        self.removal_rate = None
+        self.watch_seconds = 3600 * helpers.setting(
+            self.reddit, "nuke_watch_hours", 0.0
+        )
+        self._expansions = 0
+        self._expansions_done = threading.Condition()
+        self._roots = {}
+        self._stream = None
+        self._subtree = {}
+        self._subtree_lock = threading.Lock()
 
     def add(self, comment):
         """Enqueue a comment to be removed."""
         self.actions.append(comment)
 
-    def after(self):
-        """Add a comment to the queue.
+    def _submit(self, function, *args):
+        with self._expansions_done:
+            self._expansions += 1
+        future = self._get_executor().submit(function, *args)
+        future.add_done_callback(self._expansion_finished)
+
+    def _expansion_finished(self, future):
+        if future.exception() is not None:
+            logging.error(
+                "Failed to expand comment tree: %s", future.exception()
+            )
+        with self._expansions_done:
+            self._expansions -= 1
+            self._expansions_done.notify_all()
+
+    def _track(self, comment, root):
+        """Remember comment as part of root's subtree.
+
+        Return False if it was already known.
+
+        """
+        with self._subtree_lock:
+            if comment.fullname in self._subtree:
+                return False
+            self._subtree[comment.fullname] = root
+            return True
+
+    def _walk(self, items, root):
+        for item in self._flatten(items):
+            if isinstance(item, praw.models.MoreComments):
+                self._submit(self._expand_more, item, root)
+            elif root is not None and not self._track(item, root):
+                continue
+            elif item.distinguished is None:
+                self.add(item)
+
+    def _expand(self, comment, root):
+        try:
+            comment.refresh()
+        except prawcore.PrawcoreException as exception:
+            logging.error(
+                "Failed to retrieve comment tree on %s: %s",
+                comment.name,
+                exception,
+            )
+            return
+        self._walk(comment.replies, root)
+
+    def _expand_more(self, more_comments, root):
+        try:
+            comments = more_comments.comments()
+        except prawcore.PrawcoreException as exception:
+            logging.error(
+                "Failed to retrieve more comments under %s: %s",
+                more_comments.parent_id,
+                exception,
+            )
+            return
+        self._walk(comments, root)
+
+    def expand(self, comment):
+        """Queue the replies to comment for removal, in the background."""
+        root = None
+        if self.watch_seconds:
+            root = comment.fullname
+            with self._subtree_lock:
+                self._roots[root] = time.time() + self.watch_seconds
+                self._subtree[root] = root
+        self._submit(self._expand, comment, root)
+
+    def _forget_expired(self):
+        now = time.time()
+        with self._subtree_lock:
+            expired = {
+                root for root, expiry in self._roots.items() if expiry <= now
+            }
+            if not expired:
+                return
+            for root in expired:
+                del self._roots[root]
+            self._subtree = {
+                fullname: root
+                for fullname, root in self._subtree.items()
+                if root not in expired
+            }
+        if not self._roots:
+            self._stream = None
+
+    def watch(self):
+        """Queue new replies in remembered subtrees from the comment stream."""
+        self._forget_expired()
+        if not self._roots:
+            return
+        if self._stream is None:
+            self._stream = self.subreddit.stream.comments(pause_after=-1)
+        try:
+            for comment in self._stream:
+                if comment is None:
+                    break
+                with self._subtree_lock:
+                    root = self._subtree.get(comment.parent_id)
+                if root is None or not self._track(comment, root):
+                    continue
+                if comment.distinguished is None:
+                    self.add(comment)
+        except prawcore.PrawcoreException as exception:
+            logging.error("Failed to read comment stream: %s", exception)
+            self._stream = None
+
+    def wait(self, timeout=None):
+        """Wait for tree expansions in progress.
+
+        Return True if none are left.
+
+        """
+        with self._expansions_done:
+            return self._expansions_done.wait_for(
+                lambda: self._expansions == 0, timeout
+            )
+
+    def backlog(self):
+        """Return the number of comments waiting to be removed."""
+        return len(self.actions)
+
+    def next_batch_size(self):
+        """Return the number of comments to remove in the next batch."""
+        limiter = helpers.rate_limiter(self.reddit)
+        if limiter.remaining is None:
+            return self.batch_size
+        budget = int(limiter.remaining * self.BUDGET_SHARE)
+        return max(1, min(self.batch_size, budget))
+
+    def drain_time(self):
+        """Return the estimated seconds until the queue is empty.
+
+        Return None if no removal rate has been measured yet.
+
+        """
+        if not self.actions:
+            return 0
+        if not self.removal_rate:
+            return None
+        return len(self.actions) / self.removal_rate
+
+    def drain(self):
+        """Remove a batch of queued comments.
 
         All comments in the queue will be removed, so it's probably best to
         check if a comment is distinguished before adding it.
 
         """
-        for _ in range(30):
-            if len(self.actions) == 0:
-                return
+        batch = min(self.next_batch_size(), len(self.actions))
+        if batch == 0:
+            return False
+
+        start = time.monotonic()
+        for _ in range(batch):
             comment = self.actions.popleft()
             try:
                 comment.mod.remove()
@@ -349,6 +664,33 @@ class NukerActionBuffer(ActionBuffer):
                 logging.error(
                     "Failed to remove comment %s: %s", comment.name, exception
                 )
+        elapsed = time.monotonic() - start
+
+        if elapsed > 0:
+            rate = batch / elapsed
+            if self.removal_rate is None:
+                self.removal_rate = rate
+            else:
+                self.removal_rate = (self.removal_rate + rate) / 2
+        logging.info(
+            "Nuke queue for %s: %d comments, about %s s to drain",
+            self.subreddit,
+            len(self.actions),
+            self.drain_time(),
+        )
+        return bool(self.actions)
+
+    def after(self):
+        """Remove a batch of queued comments.
+
+        Gives tree expansions started during the cycle a few seconds to
+        finish; the rest is removed between cycles as it arrives. New replies
+        in remembered subtrees are picked up from the comment stream first.
+
+        """
+        self.wait(self.EXPANSION_WAIT)
+        self.watch()
+        self.drain()
 
 
 class Nuker(Actor):
@@ -360,6 +702,7 @@ class Nuker(Actor):
     """
 
     ACTION_BUFFER = NukerActionBuffer
+    CONCURRENT = False
     VALID_TARGETS = [praw.models.Submission, praw.models.Comment]
 
     def __init__(self, action_buffer, *args, **kwargs):
@@ -372,27 +715,27 @@ class Nuker(Actor):
         if isinstance(post, praw.models.Submission):
             return
 
-        try:
-            post.refresh()
-            post.replies.replace_more()
-            flat_tree = post.replies.list()
-        except prawcore.PrawcoreException as exception:
-            logging.error(
-                "Failed to retrieve comment tree on %s: %s",
-                post.name,
-                exception,
-            )
-            return
-
-        for comment in flat_tree:
-            if comment.distinguished is None:
-                self.action_buffer.add(comment)
+        self.action_buffer.expand(post)
 
 
 class ToolboxNoteAdderActionBuffer(ActionBuffer):
-    """A class to manage buffered Toolbox updates."""
+    """A class to manage buffered Toolbox updates.
+
+    The decoded usernotes are kept in memory along with the id of the wiki
+    revision they came from. As long as nobody else edits the page, an
+    update costs one revision listing and one edit, without downloading or
+    decompressing the blob again.
 
+    Before each write the notes are compacted, according to the praw.ini
+    settings ``usernotes_max_age_days``, ``usernotes_max_per_user`` and
+    ``usernotes_prune_deleted``. If the page would still exceed reddit's
+    size limit, the oldest notes are dropped until it fits.
+
+    """
+
+    DELETED_NAMES = {"[deleted]", "None"}
     EXPECTED_VERSION = 6
+    MAX_PAGE_SIZE = 512 * 1024
 
     @staticmethod
     def compress_blob(data_dict):
@@ -413,6 +756,18 @@ class ToolboxNoteAdderActionBuffer(ActionBuffer):
         """Initialize the ToolboxNoteAdderActionBuffer class."""
         super().__init__(*args, **kwargs)
         self.notes = []
+        self._cache = None
+        # pylint: disable=protected-access
+        reddit = self.subreddit._reddit
+        self.max_age_days = helpers.setting(
+            reddit, "usernotes_max_age_days", 0.0
+        )
+        self.max_per_user = helpers.setting(
+            reddit, "usernotes_max_per_user", 0
+        )
+        self.prune_deleted = helpers.setting(
+            reddit, "usernotes_prune_deleted", False
+        )
 
     def _prepare_indices(self, items, attr):
         indices = {a: b for b, a in enumerate(items)}
@@ -423,21 +778,23 @@ class ToolboxNoteAdderActionBuffer(ActionBuffer):
                 items.append(value)
         return indices
 
-    def _transform_page(self, content):
+    def _parse(self, content):
+        """Return the usernotes dict and decoded blob of page content."""
         usernotes_dict = json.loads(content)
         if usernotes_dict["ver"] != self.EXPECTED_VERSION:
             logging.error(
                 "Unexpected toolbox notes version: %s", usernotes_dict["ver"]
             )
             raise RuntimeError
+        return usernotes_dict, self.decompress_blob(usernotes_dict["blob"])
 
+    def _apply(self, usernotes_dict, data_dict):
+        """Add buffered notes to a usernotes dict and its decoded blob."""
         mod_list = usernotes_dict["constants"]["users"]
         mod_indices = self._prepare_indices(mod_list, "mod")
         warning_list = usernotes_dict["constants"]["warnings"]
         warning_indices = self._prepare_indices(warning_list, "level")
 
-        data_dict = self.decompress_blob(usernotes_dict["blob"])
-
         for note in self.notes:
             serializable_note = note.to_serializable(
                 mod_indices, warning_indices
@@ -446,13 +803,110 @@ class ToolboxNoteAdderActionBuffer(ActionBuffer):
             author_notes = data_dict.setdefault(note.author, {"ns": []})
             author_notes["ns"].insert(0, serializable_note)
 
+    def _compact(self, data_dict):
+        """Prune notes according to the configured policies.
+
+        Return a dict counting the notes pruned by each policy.
+
+        """
+        pruned = {"deleted": 0, "old": 0, "excess": 0}
+        cutoff = time.time() - self.max_age_days * 86400
+        for user in list(data_dict):
+            notes = data_dict[user]["ns"]
+            if self.prune_deleted and user in self.DELETED_NAMES:
+                pruned["deleted"] += len(notes)
+                del data_dict[user]
+                continue
+            if self.max_age_days:
+                kept = [note for note in notes if note["t"] >= cutoff]
+                pruned["old"] += len(notes) - len(kept)
+                notes = kept
+            if self.max_per_user and len(notes) > self.max_per_user:
+                pruned["excess"] += len(notes) - self.max_per_user
+                notes = notes[: self.max_per_user]
+            if notes:
+                data_dict[user]["ns"] = notes
+            else:
+                del data_dict[user]
+        return pruned
+
+    @staticmethod
+    def _drop_oldest(data_dict, fraction=0.1):
+        """Drop the oldest fraction of notes. Return the number dropped."""
+        notes = sorted(
+            (note["t"], user, index)
+            for user, user_dict in data_dict.items()
+            for index, note in enumerate(user_dict["ns"])
+        )
+        oldest = {}
+        for _, user, index in notes[: math.ceil(len(notes) * fraction)]:
+            oldest.setdefault(user, set()).add(index)
+        for user, indexes in oldest.items():
+            kept = [
+                note
+                for index, note in enumerate(data_dict[user]["ns"])
+                if index not in indexes
+            ]
+            if kept:
+                data_dict[user]["ns"] = kept
+            else:
+                del data_dict[user]
+        return sum(len(indexes) for indexes in oldest.values())
+
+    def _serialize(self, usernotes_dict, data_dict):
+        """Compact the notes and return the page content to write."""
+        pruned = self._compact(data_dict)
         usernotes_dict["blob"] = self.compress_blob(data_dict)
-        return json.dumps(usernotes_dict)
+        content = json.dumps(usernotes_dict)
+        pruned["oversize"] = 0
+        while len(content) > self.MAX_PAGE_SIZE:
+            dropped = self._drop_oldest(data_dict)
+            if not dropped:
+                break
+            pruned["oversize"] += dropped
+            usernotes_dict["blob"] = self.compress_blob(data_dict)
+            content = json.dumps(usernotes_dict)
+        if any(pruned.values()):
+            logging.info(
+                "Pruned usernotes on %s (%d bytes): %s",
+                self.subreddit,
+                len(content),
+                ", ".join(
+                    "{} {}".format(count, policy)
+                    for policy, count in pruned.items()
+                    if count
+                ),
+            )
+        return content
+
+    def _transform_page(self, content):
+        usernotes_dict, data_dict = self._parse(content)
+        self._apply(usernotes_dict, data_dict)
+        return self._serialize(usernotes_dict, data_dict)
+
+    def _newest_revision(self, wiki_page):
+        """Return the newest revision of the page.
+
+        If the cache holds our own last edit, whose id reddit doesn't
+        return, the id is filled in when that edit is still the newest.
+
+        """
+        cache = self._cache
+        if cache is None or cache.revision is not None:
+            return next(wiki_page.revisions(limit=1))
+        revisions = list(wiki_page.revisions(limit=2))
+        if len(revisions) == 2 and revisions[1]["id"] == cache.edited_from:
+            self._cache = cache._replace(revision=revisions[0]["id"])
+        return revisions[0]
 
     def add(self, note):
         """Add a note to the buffer."""
         self.notes.append(note)
 
+    def depth(self):
+        """Return the number of notes waiting to be added."""
+        return len(self.notes)
+
     def after(self):
         """Add queued reports to the wiki."""
         if not self.notes:
@@ -460,18 +914,50 @@ class ToolboxNoteAdderActionBuffer(ActionBuffer):
 
         wiki_page = self.subreddit.wiki["usernotes"]
         try:
-            wiki_page.update(self._transform_page)
+            revision = self._newest_revision(wiki_page)
+            revision_id = revision["id"]
+            cache, self._cache = self._cache, None
+            if cache is not None and cache.revision == revision_id:
+                usernotes_dict, data_dict = cache.usernotes, cache.data
+            else:
+                content = revision["page"].content_md
+                usernotes_dict, data_dict = self._parse(content)
+
+            while True:
+                self._apply(usernotes_dict, data_dict)
+                content = self._serialize(usernotes_dict, data_dict)
+                try:
+                    wiki_page.edit(content, reason=None, previous=revision_id)
+                    break
+                except prawcore.Conflict as conflict:
+                    response_body = json.loads(
+                        conflict.response.content.decode()
+                    )
+                    usernotes_dict, data_dict = self._parse(
+                        response_body["newcontent"]
+                    )
+                    revision_id = response_body["newrevision"]
         except prawcore.PrawcoreException as exception:
             logging.error("Failed to load toolbox usernotes: %s", exception)
             return
         else:
+            self._cache = _UsernotesCache(
+                None, revision_id, usernotes_dict, data_dict
+            )
             self.notes.clear()
 
 
+class _UsernotesCache(
+    namedtuple("_UsernotesCache", "revision edited_from usernotes data")
+):
+    __slots__ = ()
+
+
 class ToolboxNoteAdder(Actor):
     """A class to add Moderator Toolbox notes to the wiki."""
 
     ACTION_BUFFER = ToolboxNoteAdderActionBuffer
+    CONCURRENT = False
     REQUIRED_TYPES = {"level": str, "text": str}
     VALID_TARGETS = [praw.models.Submission, praw.models.Comment]
 
@@ -525,45 +1011,193 @@ class BufferedNote(
 
 
 class AutomodWatcherActionBuffer(ActionBuffer):
-    """A class to manage buffered AutoMod updates."""
+    """A class to manage buffered AutoMod updates.
+
+    Additions are held for ``automod_write_window`` seconds (a praw.ini
+    setting) after the first one arrives, then written in a single edit.
+    Items already in the placeholder's list are skipped, and the page isn't
+    edited at all if nothing new remains.
+
+    The time each item was added by the bot is kept in the
+    ``automod_entries`` table. Items older than ``automod_entry_max_days``
+    are removed, and the oldest are dropped when a list would grow beyond
+    ``automod_max_entries``. Items added by hand are never removed.
+
+    A placeholder must be an item of a flow list, as in
+    ``author: [placeholder]``. Items queued for a placeholder that isn't
+    found in such a list are dropped with a warning.
+
+    """
 
     def __init__(self, *args, **kwargs):
         """Initialize the AutomodWatcherActionBuffer class."""
         super().__init__(*args, **kwargs)
         self.placeholder_dict = {}
+        # pylint: disable=protected-access
+        reddit = self.subreddit._reddit
+        self.write_window = helpers.setting(
+            reddit, "automod_write_window", 0.0
+        )
+        self.max_entries = helpers.setting(reddit, "automod_max_entries", 0)
+        self.max_age_days = helpers.setting(
+            reddit, "automod_entry_max_days", 0.0
+        )
+        self._pending_since = None
+        self._added_at = None
+        self._subreddit_name = str(self.subreddit).casefold()
+
+    @property
+    def added_at(self):
+        """Return a dict mapping placeholders to the items' added times."""
+        if self._added_at is None:
+            self._added_at = {}
+            if self.database is not None:
+                cursor = self.database.reader.execute(
+                    "SELECT placeholder, entry, added FROM automod_entries "
+                    "WHERE subreddit = ?",
+                    (self._subreddit_name,),
+                )
+                for placeholder, entry, added in cursor:
+                    self._added_at.setdefault(placeholder, {})[entry] = added
+        return self._added_at
+
+    def _cutoff(self, now):
+        if not self.max_age_days:
+            return None
+        return now - self.max_age_days * 86400
+
+    def _expired(self, now):
+        """Return True if an item is past its maximum age."""
+        cutoff = self._cutoff(now)
+        return cutoff is not None and any(
+            added < cutoff
+            for entries in self.added_at.values()
+            for added in entries.values()
+        )
 
-    def _transform_page(self, content):
-        content = unescape(content)
-        for placeholder, buffer in self.placeholder_dict.items():
-            new_text = ", ".join([placeholder] + buffer)
-            content = content.replace(placeholder, new_text)
-        return content
+    def _apply(self, config, now):
+        """Update config and return the new added times per placeholder."""
+        cutoff = self._cutoff(now)
+        result = {}
+        for placeholder in set(self.placeholder_dict) | set(self.added_at):
+            if placeholder not in config:
+                # Its lists are gone, so there is nothing left to expire
+                result[placeholder] = {}
+                continue
+            added_at = dict(self.added_at.get(placeholder, {}))
+            for entry, added in list(added_at.items()):
+                if cutoff is not None and added < cutoff:
+                    config.discard(placeholder, entry)
+                    del added_at[entry]
+            for item in self.placeholder_dict.get(placeholder, []):
+                if config.add(placeholder, item):
+                    added_at[item.casefold()] = now
+            if self.max_entries:
+                for entry in sorted(added_at, key=added_at.get):
+                    if config.size(placeholder) <= self.max_entries:
+                        break
+                    config.discard(placeholder, entry)
+                    del added_at[entry]
+            result[placeholder] = added_at
+        return result
+
+    def _store(self, result):
+        """Keep the added times in result, in memory and in the database."""
+        rows = []
+        for placeholder, added_at in result.items():
+            self.added_at[placeholder] = added_at
+            rows.extend(
+                (self._subreddit_name, placeholder, entry, added)
+                for entry, added in added_at.items()
+            )
+        if self.database is None:
+            return
+        with self.database.write() as cursor:
+            cursor.executemany(
+                "DELETE FROM automod_entries "
+                "WHERE subreddit = ? AND placeholder = ?",
+                [
+                    (self._subreddit_name, placeholder)
+                    for placeholder in result
+                ],
+            )
+            cursor.executemany(
+                "INSERT INTO automod_entries (subreddit, placeholder, entry, "
+                "added) VALUES(?,?,?,?)",
+                rows,
+            )
 
     def after(self):
         """Add accumulated list of users to AutoMod config."""
-        if not any(self.placeholder_dict.values()):
+        now = time.time()
+        if not any(self.placeholder_dict.values()) and not self._expired(now):
+            return
+
+        started = time.monotonic()
+        if self._pending_since is None:
+            self._pending_since = started
+        if started - self._pending_since < self.write_window:
             return
 
         automod_config = self.subreddit.wiki["config/automoderator"]
+        placeholders = set(self.placeholder_dict) | set(self.added_at)
 
         try:
-            automod_config.update(self._transform_page)
+            revision = next(automod_config.revisions(limit=1))
+            revision_id = revision["id"]
+            content = revision["page"].content_md
+            while True:
+                config = automod.AutomodConfig(unescape(content), placeholders)
+                result = self._apply(config, now)
+                new_content = config.render()
+                if new_content == unescape(content):
+                    break
+                try:
+                    automod_config.edit(
+                        new_content, reason=None, previous=revision_id
+                    )
+                    break
+                except prawcore.Conflict as conflict:
+                    response_body = json.loads(
+                        conflict.response.content.decode()
+                    )
+                    content = response_body["newcontent"]
+                    revision_id = response_body["newrevision"]
         except prawcore.PrawcoreException as exception:
             logging.error("Failed to update automod config %s", exception)
         else:
-            for buffer in self.placeholder_dict.values():
+            self._store(result)
+            for placeholder, buffer in self.placeholder_dict.items():
+                if buffer and placeholder not in config:
+                    logging.warning(
+                        "Placeholder %s not found in a [...] list on "
+                        "/r/%s/wiki/config/automoderator, dropped %d items",
+                        placeholder,
+                        self.subreddit,
+                        len(buffer),
+                    )
                 buffer.clear()
+            self._pending_since = None
+
+    def depth(self):
+        """Return the number of items waiting to be added."""
+        return sum(len(buffer) for buffer in self.placeholder_dict.values())
 
     def extend(self, placeholder, author):
-        """Add items to the placeholder's buffer."""
+        """Add items to the placeholder's buffer, skipping duplicates."""
         buffer = self.placeholder_dict.setdefault(placeholder, [])
-        buffer.extend(author)
+        buffered = {item.casefold() for item in buffer}
+        for item in author:
+            if item.casefold() not in buffered:
+                buffered.add(item.casefold())
+                buffer.append(item)
 
 
 class AutomodWatcher(Actor):
     """An abstract class for adding items to AutoMod configuration lists."""
 
     ACTION_BUFFER = AutomodWatcherActionBuffer
+    CONCURRENT = False
     REQUIRED_TYPES = {"placeholder": str}
 
     def __init__(self, placeholder, action_buffer, *args, **kwargs):
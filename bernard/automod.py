@@ -0,0 +1,140 @@
+"""Provide a placeholder-aware model of the AutoMod configuration page."""
+import re
+from collections import OrderedDict
+
+
+def _key(token):
+    """Return the casefolded item of a list token, without quotes."""
+    return token.strip().strip("'\"").casefold()
+
+
+class EntryList:
+    """The items of one AutoMod list that holds a placeholder.
+
+    Items after the placeholder are managed by the bot; the placeholder and
+    anything before it are left alone. The text is only rebuilt once the
+    list is changed, so untouched lists keep their formatting.
+
+    """
+
+    def __init__(self, placeholder, text):
+        """Initialize the EntryList class."""
+        self.text = text
+        self.changed = False
+        tokens = text.split(",")
+        keys = [_key(token) for token in tokens]
+        split = keys.index(placeholder.casefold()) + 1
+        self._head = tokens[:split]
+        self._fixed = set(keys[:split])
+        body = tokens[split:]
+        self._trailer = []
+        if body and not body[-1].strip():
+            self._trailer = [body.pop()]
+        self.entries = OrderedDict()
+        for token in body:
+            if _key(token):
+                self.entries.setdefault(_key(token), token)
+
+    def __contains__(self, item):
+        """Return True if item is in the list, ignoring case."""
+        key = item.casefold()
+        return key in self.entries or key in self._fixed
+
+    def __len__(self):
+        """Return the number of items after the placeholder."""
+        return len(self.entries)
+
+    def add(self, item):
+        """Append item unless already listed, and return True if added."""
+        if item in self:
+            return False
+        self.entries[item.casefold()] = " " + item
+        self.changed = True
+        return True
+
+    def discard(self, item):
+        """Remove item if listed, and return True if removed."""
+        if self.entries.pop(item.casefold(), None) is None:
+            return False
+        self.changed = True
+        return True
+
+    def render(self):
+        """Return the text of the list."""
+        if not self.changed:
+            return self.text
+        tokens = self._head + list(self.entries.values()) + self._trailer
+        return ",".join(tokens)
+
+
+class AutomodConfig:
+    """The AutoMod configuration, with the lists holding placeholders.
+
+    The page is scanned once for all placeholders. Each occurrence must be
+    an item of a flow list, such as ``author: [placeholder, a, b]``; a
+    placeholder may hold several lists, which are then updated together.
+    Everything outside those lists is kept verbatim.
+
+    """
+
+    def __init__(self, content, placeholders):
+        """Initialize the AutomodConfig class."""
+        self.lists = {placeholder: [] for placeholder in placeholders}
+        self._parts = []
+        if not self.lists:
+            self._parts.append(content)
+            return
+
+        pattern = re.compile(
+            "|".join(
+                re.escape(placeholder)
+                for placeholder in sorted(self.lists, key=len, reverse=True)
+            )
+        )
+        position = 0
+        for match in pattern.finditer(content):
+            # Just past the opening bracket, and at the closing one
+            start = content.rfind("[", position, match.start()) + 1
+            end = content.find("]", match.end())
+            if start == 0 or end == -1 or "]" in content[start:end]:
+                continue
+            try:
+                entry_list = EntryList(match.group(), content[start:end])
+            except ValueError:
+                # Only part of an item, as in "placeholder" in "a.placeholder"
+                continue
+            self._parts.append(content[position:start])
+            self._parts.append(entry_list)
+            self.lists[match.group()].append(entry_list)
+            position = end
+        self._parts.append(content[position:])
+
+    def __contains__(self, placeholder):
+        """Return True if placeholder holds at least one list."""
+        return bool(self.lists.get(placeholder))
+
+    def add(self, placeholder, item):
+        """Add item to the placeholder's lists and return True if added."""
+        return any(
+            [entry_list.add(item) for entry_list in self.lists[placeholder]]
+        )
+
+    def discard(self, placeholder, item):
+        """Remove item from the placeholder's lists; return True if found."""
+        return any(
+            [
+                entry_list.discard(item)
+                for entry_list in self.lists[placeholder]
+            ]
+        )
+
+    def size(self, placeholder):
+        """Return the length of the placeholder's longest list."""
+        return max(len(entry_list) for entry_list in self.lists[placeholder])
+
+    def render(self):
+        """Return the text of the page."""
+        return "".join(
+            part if isinstance(part, str) else part.render()
+            for part in self._parts
+        )
@@ -3,38 +3,215 @@ import logging
 
 import prawcore
 
+from . import db, metrics, tracing
+from .seen import SeenReports
+
 
 class Browser:
     """A class to fetch reports and dispatch to rules."""
 
-    def __init__(self, rules, buffers, subreddit, database):
+    # Attributes that rules and actors read from every reported item
+    HYDRATED_ATTRIBUTES = ("author", "permalink", "subreddit")
+
+    def __init__(self, rules, buffers, subreddit, database, action_log=None):
         """Initialize the Browser class."""
         self.rules = rules
         self.buffers = buffers
         self.subreddit = subreddit
-        self.database = database
+        self.database = db.wrap(database)
+        self.action_log = action_log
+        self.seen = SeenReports(self.database, subreddit)
+        self.fetch_failed = False
+        self._dispatch = self.build_dispatch(rules)
+
+    def replace_rules(self, rules, buffers):
+        """Switch to a new set of rules and buffers between cycles.
+
+        Reports that matched no rule were never recorded as seen, so any that
+        match the new rules are dispatched on the next cycle.
+
+        """
+        dispatch = self.build_dispatch(rules)
+        self.rules, self.buffers, self._dispatch = rules, buffers, dispatch
+
+    @staticmethod
+    def build_dispatch(rules):
+        """Return a dict mapping (command, target type) to matching rules."""
+        dispatch = {}
+        for rule in rules:
+            for command in rule.commands:
+                for target in rule.targets:
+                    key = (command.casefold(), target)
+                    dispatch.setdefault(key, []).append(rule)
+        return dispatch
 
     def check_command(self, command, mod, post):
-        """Check if any rule matches this report."""
-        for rule in self.rules:
-            rule.parse(command, mod, post)
+        """Run every rule that matches this report.
 
-    def reports(self):
-        """Generate mod reports for a subreddit.
+        Return the number of rules that acted.
+
+        """
+        rules = self._dispatch.get((command.casefold(), type(post)), ())
+        return sum(bool(rule.execute(mod, post)) for rule in rules)
+
+    def hydrate(self, items):
+        """Load the items that are missing attributes used by actors.
 
-        Yields tuple of report, mod name, and target.
+        Items from report listings are complete already. Any others are
+        fetched through ``/api/info``, which takes 100 items per request,
+        rather than one lazy request each.
 
         """
+        missing = {
+            item.fullname: item
+            for item in items
+            if not all(
+                attribute in vars(item)
+                for attribute in self.HYDRATED_ATTRIBUTES
+            )
+        }
+        if not missing:
+            return
+        # pylint: disable=protected-access
+        reddit = self.subreddit._reddit
         try:
-            for post in self.subreddit.mod.reports(limit=None):
-                for mod_report in post.mod_reports:
-                    yield (str(mod_report[0]), mod_report[1], post)
+            for loaded in reddit.info(list(missing)):
+                item = missing.get(loaded.fullname)
+                if item is None:
+                    continue
+                item.__dict__.update(
+                    (name, value)
+                    for name, value in vars(loaded).items()
+                    if not name.startswith("_")
+                )
         except prawcore.PrawcoreException as exception:
-            logging.error("Error fetching reports: %s", exception)
+            # Actors can still load what they need themselves
+            logging.error("Error hydrating reported items: %s", exception)
+
+    def reports(self, posts=None):
+        """Generate mod reports for a subreddit.
+
+        Yields tuple of report, mod name, and target. If ``posts`` is given,
+        reports are read from it instead of fetching the modqueue listing.
+
+        """
+        if posts is None:
+            posts = []
+            with tracing.span("reports", subreddit=str(self.subreddit)):
+                try:
+                    for post in self.subreddit.mod.reports(limit=None):
+                        posts.append(post)
+                except prawcore.PrawcoreException as exception:
+                    self.fetch_failed = True
+                    logging.error("Error fetching reports: %s", exception)
+        for post in posts:
+            for mod_report in post.mod_reports:
+                yield (str(mod_report[0]), mod_report[1], post)
+
+    def run(self, posts=None):
+        """Fetch reports and dispatch new ones to actors.
+
+        Reports processed in an earlier cycle are skipped. Reports that match
+        no rule aren't recorded as processed, so that a rule added later
+        still acts on them. Return the number of rules that acted.
 
-    def run(self):
-        """Fetch reports and dispatch to actors."""
-        for command, mod, post in self.reports():
-            self.check_command(command, mod, post)
+        """
+        self.fetch_failed = False
+        acted = 0
+        current = set()
+        subreddit = str(self.subreddit)
+        new_reports = {}
+        for command, mod, post in self.reports(posts):
+            metrics.REPORTS_FETCHED.inc(subreddit=subreddit)
+            key = self.seen.key(command, mod, post)
+            current.add(key)
+            matches = (command.casefold(), type(post)) in self._dispatch
+            if matches and key not in self.seen:
+                new_reports.setdefault(key, (command, mod, post))
+
+        matched = {post.fullname: post for _, _, post in new_reports.values()}
+        with tracing.span("hydrate", subreddit=subreddit):
+            self.hydrate(list(matched.values()))
+
+        for key, (command, mod, post) in new_reports.items():
+            acted += self.check_command(command, mod, post)
+            self.seen.add(key)
+        # A partial listing can't tell us which reports were cleared
+        if not self.fetch_failed:
+            self.seen.retain(current)
+        # Write the whole cycle in one transaction
+        with self.database.write() as cursor:
+            if self.action_log is not None:
+                self.action_log.flush(cursor)
+            self.seen.flush(cursor)
         for buffer in self.buffers:
-            buffer.after()
+            with tracing.span(
+                "after", subreddit=subreddit, buffer=type(buffer).__name__
+            ):
+                buffer.after()
+        return acted
+
+    def backlog(self):
+        """Return the number of items queued in this Browser's buffers."""
+        return sum(buffer.backlog() for buffer in self.buffers)
+
+    def drain(self):
+        """Work through part of each buffer's backlog."""
+        for buffer in self.buffers:
+            if buffer.backlog():
+                buffer.drain()
+
+
+class MultiredditFetcher:
+    """A class to fetch reports for many Browsers at once.
+
+    Reports are read from the combined ``/r/a+b+c/about/reports`` listing
+    and routed to each Browser by the subreddit of the reported item.
+
+    """
+
+    MAX_NAMES_LENGTH = 1500
+
+    def __init__(self, reddit):
+        """Initialize the MultiredditFetcher class."""
+        self.reddit = reddit
+
+    def chunks(self, browsers):
+        """Split browsers into groups whose combined name fits in a URL."""
+        chunk, length = [], 0
+        for browser in browsers:
+            name_length = len(str(browser.subreddit)) + 1
+            if chunk and length + name_length > self.MAX_NAMES_LENGTH:
+                yield chunk
+                chunk, length = [], 0
+            chunk.append(browser)
+            length += name_length
+        if chunk:
+            yield chunk
+
+    def fetch(self, browsers):
+        """Return a dict mapping each Browser to its reported items.
+
+        Browsers whose listing could not be fetched are left out.
+
+        """
+        result = {}
+        for chunk in self.chunks(browsers):
+            by_name = {
+                str(browser.subreddit).casefold(): browser for browser in chunk
+            }
+            names = "+".join(str(browser.subreddit) for browser in chunk)
+            posts = {browser: [] for browser in chunk}
+            try:
+                listing = self.reddit.subreddit(names).mod.reports(limit=None)
+                for post in listing:
+                    browser = by_name.get(str(post.subreddit).casefold())
+                    if browser is not None:
+                        posts[browser].append(post)
+            except prawcore.PrawcoreException as exception:
+                logging.error(
+                    "Error fetching reports for %s: %s", names, exception
+                )
+                continue
+            result.update(posts)
+        return result
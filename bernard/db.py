@@ -0,0 +1,103 @@
+"""Provide the Database class."""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import metrics
+
+BUSY_TIMEOUT = 30
+
+
+def connect(path, read_only=False):
+    """Return a connection to the database at path, with our pragmas set.
+
+    The database is switched to WAL mode, so that readers, including those
+    outside the bot, never block the writer and vice versa.
+
+    """
+    uri = Path(path).resolve().as_uri()
+    if read_only:
+        uri += "?mode=ro"
+    connection = sqlite3.connect(
+        uri, uri=True, timeout=BUSY_TIMEOUT, check_same_thread=False
+    )
+    connection.execute("PRAGMA busy_timeout = {}".format(BUSY_TIMEOUT * 1000))
+    if not read_only:
+        connection.execute("PRAGMA journal_mode = WAL")
+    # Safe in WAL mode: a power loss may drop the last commits, but can't
+    # corrupt the database.
+    connection.execute("PRAGMA synchronous = NORMAL")
+    return connection
+
+
+class Database:
+    """A SQLite database with a single writer connection.
+
+    Every write, from any thread, goes through ``write``, which serializes
+    transactions on the writer connection. Reads use ``reader``, a read-only
+    connection per thread. A Database wrapping a bare connection, such as an
+    in-memory one, uses that connection for reads as well.
+
+    """
+
+    @classmethod
+    def open(cls, path):
+        """Return a Database for the file at path."""
+        return cls(connect(path), path)
+
+    def __init__(self, writer, path=None):
+        """Initialize the Database class."""
+        self.writer = writer
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._rollback_hooks = []
+
+    @property
+    def reader(self):
+        """Return this thread's read-only connection."""
+        if self.path is None:
+            return self.writer
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = connect(self.path, read_only=True)
+            self._local.connection = connection
+        return connection
+
+    def on_rollback(self, hook):
+        """Call hook with no arguments whenever write rolls back.
+
+        Use it to drop state cached from the rolled back transaction.
+
+        """
+        if hook not in self._rollback_hooks:
+            self._rollback_hooks.append(hook)
+
+    @contextmanager
+    def write(self):
+        """Yield a writer cursor inside a transaction.
+
+        The transaction is committed on exit, or rolled back if an exception
+        is raised.
+
+        """
+        with self._lock:
+            cursor = self.writer.cursor()
+            try:
+                yield cursor
+            except BaseException:
+                self.writer.rollback()
+                for hook in self._rollback_hooks:
+                    hook()
+                raise
+            else:
+                with metrics.DB_COMMIT_SECONDS.time():
+                    self.writer.commit()
+
+
+def wrap(database):
+    """Return database as a Database, wrapping a bare connection."""
+    if isinstance(database, Database):
+        return database
+    return Database(database)
@@ -1,20 +1,135 @@
 """A logging handler that emits to a Discord webhook."""
-import requests
+import queue
+import threading
+import time
+from collections import OrderedDict
 from logging import Handler
 
+import requests
+
+_STOP = object()
+
 
 class DiscordHandler(Handler):
-    """A logging handler that emits to a Discord webhook."""
+    """A logging handler that emits to a Discord webhook.
 
-    def __init__(self, webhook, *args, **kwargs):
+    Records are queued and sent by a background thread, so that logging never
+    waits on Discord. The thread collects records for ``interval`` seconds
+    and sends them together, with repeated records sent once along with their
+    count. Rate limited requests are retried after the delay Discord asks
+    for. If the queue is full, records are dropped and counted instead.
+
+    """
+
+    MAX_LENGTH = 2000
+    MAX_RETRIES = 5
+    TIMEOUT = 10
+
+    def __init__(self, webhook, *args, interval=2, max_queue=1000, **kwargs):
         """Initialize the DiscordHandler class."""
         super().__init__(*args, **kwargs)
         self.webhook = webhook
+        self.interval = interval
+        self.dropped = 0
+        self.session = requests.Session()
+        self._queue = queue.Queue(max_queue)
+        self._thread = threading.Thread(
+            target=self._run, name="DiscordHandler", daemon=True
+        )
+        self._thread.start()
 
     def emit(self, record):
-        """Emit record to the Discord webhook."""
-        json = {"content": self.format(record)}
+        """Queue record to be sent to the Discord webhook."""
         try:
-            requests.post(self.webhook, json=json)
-        except requests.RequestException:
+            self._queue.put_nowait((self.format(record), record))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+        except Exception:  # pylint: disable=broad-except
             self.handleError(record)
+
+    def close(self):
+        """Send the records still queued and stop the background thread."""
+        if self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=self.TIMEOUT)
+            except queue.Full:
+                pass
+            self._thread.join(self.TIMEOUT)
+        self.session.close()
+        super().close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            while True:
+                try:
+                    item = self._queue.get(
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._send(batch)
+
+    def _messages(self, batch):
+        """Return the contents of the messages needed to send batch."""
+        counts = OrderedDict()
+        for text, _ in batch:
+            counts[text] = counts.get(text, 0) + 1
+        lines = [
+            text if count == 1 else "{} (x{})".format(text, count)
+            for text, count in counts.items()
+        ]
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            lines.append("({} more records dropped)".format(dropped))
+
+        messages = []
+        for line in lines:
+            line = line[: self.MAX_LENGTH]
+            if (
+                messages
+                and len(messages[-1]) + len(line) + 1 <= self.MAX_LENGTH
+            ):
+                messages[-1] += "\n" + line
+            else:
+                messages.append(line)
+        return messages
+
+    @staticmethod
+    def _retry_after(response):
+        """Return the seconds to wait before retrying a rate limited post."""
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            pass
+        try:
+            return float(response.json()["retry_after"])
+        except (KeyError, TypeError, ValueError):
+            return 1
+
+    def _send(self, batch):
+        for content in self._messages(batch):
+            for _ in range(self.MAX_RETRIES):
+                try:
+                    response = self.session.post(
+                        self.webhook,
+                        json={"content": content},
+                        timeout=self.TIMEOUT,
+                    )
+                except requests.RequestException:
+                    self.handleError(batch[0][1])
+                    break
+                if response.status_code != 429:
+                    break
+                time.sleep(self._retry_after(response))
@@ -1,4 +1,27 @@
 """Helper functions used in various modules."""
+import logging
+from collections import namedtuple
+
+from praw.const import API_PATH
+
+from .user_cache import UserIdCache
+
+INFO_BATCH_SIZE = 100
+
+
+def setting(reddit, name, default):
+    """Return a setting from praw.ini, converted to the type of default."""
+    value = reddit.config.custom.get(name)
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
+
+
+def rate_limiter(reddit):
+    """Return the prawcore RateLimiter shared by a Reddit instance."""
+    return reddit._core._rate_limiter  # pylint: disable=protected-access
 
 
 def deserialize_thing_id(thing_id):
@@ -6,37 +29,104 @@ def deserialize_thing_id(thing_id):
     return tuple(int(x, base=36) for x in thing_id[1:].split("_"))
 
 
-def update_sr_tables(cursor, subreddit):
-    """Update tables of subreddits and subreddit-moderator relationships."""
+class SubredditInfo(
+    namedtuple("SubredditInfo", "id display_name subscribers moderators")
+):
+    """Data about a subreddit, as stored by write_sr_tables."""
+
+    __slots__ = ()
+
+
+def fetch_sr_info(subreddit):
+    """Return the SubredditInfo of subreddit, fetched from reddit."""
     _, subreddit_id = deserialize_thing_id(subreddit.fullname)
+    return SubredditInfo(
+        subreddit_id,
+        str(subreddit),
+        subreddit.subscribers,
+        [str(moderator) for moderator in subreddit.moderator()],
+    )
+
+
+def fetch_sr_infos(reddit, subreddits):
+    """Return the SubredditInfo of each of subreddits, fetched from reddit.
+
+    Ids and subscriber counts are fetched for up to 100 subreddits at a time
+    through ``/api/info``; moderators still take one request per subreddit.
+    Subreddits missing from ``/api/info``, e.g. banned ones, are left out.
+
+    """
+    abouts = {}
+    names = [str(subreddit) for subreddit in subreddits]
+    while names:
+        chunk, names = names[:INFO_BATCH_SIZE], names[INFO_BATCH_SIZE:]
+        listing = reddit.get(
+            API_PATH["info"], params={"sr_name": ",".join(chunk)}
+        )
+        for about in listing:
+            abouts[about.display_name.casefold()] = about
+
+    result = []
+    for subreddit in subreddits:
+        about = abouts.get(str(subreddit).casefold())
+        if about is None:
+            logging.error("No info on subreddit %s", subreddit)
+            continue
+        _, subreddit_id = deserialize_thing_id(about.fullname)
+        result.append(
+            SubredditInfo(
+                subreddit_id,
+                str(subreddit),
+                about.subscribers,
+                [str(moderator) for moderator in subreddit.moderator()],
+            )
+        )
+    return result
+
+
+def write_sr_tables(cursor, info, user_ids=None):
+    """Write a SubredditInfo to the subreddit and moderator tables.
+
+    Only the moderators added or removed since the last write are changed.
+
+    """
+    if user_ids is None:
+        user_ids = UserIdCache()
 
     # Add subreddits and update subscriber counts
     cursor.execute(
         "INSERT OR IGNORE INTO subreddits (id, display_name) VALUES(?,?)",
-        (subreddit_id, str(subreddit)),
+        (info.id, info.display_name),
     )
     cursor.execute(
-        "UPDATE subreddits SET subscribers = ? " "WHERE id = ?",
-        (subreddit.subscribers, subreddit_id),
+        "UPDATE subreddits SET subscribers = ? WHERE id = ?",
+        (info.subscribers, info.id),
     )
 
-    # Refresh listing of subreddits' moderators
     cursor.execute(
-        "DELETE FROM subreddit_moderator " "WHERE subreddit_id = ?",
-        (subreddit_id,),
+        "SELECT moderator_id FROM subreddit_moderator WHERE subreddit_id = ?",
+        (info.id,),
+    )
+    current = {row[0] for row in cursor.fetchall()}
+    moderator_ids = set(user_ids.get_many(cursor, info.moderators).values())
+    cursor.executemany(
+        "INSERT INTO subreddit_moderator (subreddit_id, moderator_id) "
+        "VALUES(?,?)",
+        [(info.id, moderator_id) for moderator_id in moderator_ids - current],
+    )
+    cursor.executemany(
+        "DELETE FROM subreddit_moderator "
+        "WHERE subreddit_id = ? AND moderator_id = ?",
+        [(info.id, moderator_id) for moderator_id in current - moderator_ids],
     )
 
-    for moderator in subreddit.moderator():
-        cursor.execute(
-            "INSERT OR IGNORE INTO users (username) " "VALUES(?)",
-            (str(moderator),),
-        )
-        cursor.execute(
-            "SELECT id FROM users WHERE username = ?", (str(moderator),)
-        )
-        moderator_id = cursor.fetchone()[0]
-        cursor.execute(
-            "INSERT OR IGNORE INTO subreddit_moderator "
-            "(subreddit_id, moderator_id) VALUES(?,?)",
-            (subreddit_id, moderator_id),
-        )
+
+def update_sr_tables(cursor, subreddit, user_ids=None):
+    """Update tables of subreddits and subreddit-moderator relationships.
+
+    Everything is fetched before anything is written, so network errors
+    leave no partial writes (or stale cached user ids) behind. Callers that
+    hold a write lock should fetch with fetch_sr_info first instead.
+
+    """
+    write_sr_tables(cursor, fetch_sr_info(subreddit), user_ids)
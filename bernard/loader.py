@@ -1,8 +1,16 @@
 """Module for loading configurations."""
+import logging
+import time
+
 import praw
 import yaml
 
-from . import actors, browser, helpers
+from . import actors, db, helpers
+from .action_log import ActionLog
+from .browser import Browser
+
+# The libyaml loader is much faster, when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 _TARGET_MAP = {"comment": praw.models.Comment, "post": praw.models.Submission}
 
@@ -32,16 +40,22 @@ def validate_actor_config(actor_class, params, target_types):
 class ActionBufferBuilder:
     """Provide ActionBuffers for a subreddit configuration."""
 
-    def __init__(self, subreddit):
-        """Initialize the ActionBufferBuilder class."""
+    def __init__(self, subreddit, database=None, buffers=()):
+        """Initialize the ActionBufferBuilder class.
+
+        Existing ``buffers`` are handed out again instead of new instances
+        of their classes, so that reloading keeps their queued items.
+
+        """
         self.subreddit = subreddit
-        self._buffers = {}
+        self.database = database
+        self._buffers = {type(buffer): buffer for buffer in buffers}
 
     def get(self, cls):
         """Return a shared ActionBuffer instance of the given class."""
         buffer = self._buffers.get(cls)
         if buffer is None:
-            buffer = cls(self.subreddit)
+            buffer = cls(self.subreddit, self.database)
             self._buffers[cls] = buffer
         return buffer
 
@@ -72,32 +86,139 @@ def parse_actor_config(subreddit, action_buffer_builder, config, target_types):
     return actor_class(subreddit=subreddit, **params)
 
 
-def parse_subreddit_config(database, subreddit, config):
-    """Parse subreddit configuration and return a Browser."""
-    action_buffer_builder = ActionBufferBuilder(subreddit)
-    browser_rules = [
-        parse_rule_config(
-            database, subreddit, action_buffer_builder, rule_config
-        )
-        for rule_config in config
-    ]
+def parse_subreddit_config(
+    database, subreddit, config, user_ids=None, sync_tables=True
+):
+    """Parse subreddit configuration and return a Browser.
+
+    Unless ``sync_tables`` is false, the subreddit and moderator tables are
+    also updated, which takes a few requests.
 
-    helpers.update_sr_tables(database.cursor(), subreddit)
-    database.commit()
+    """
+    database = db.wrap(database)
+    action_buffer_builder = ActionBufferBuilder(subreddit, database)
+    action_log = ActionLog(database, user_ids=user_ids)
+    browser_rules = parse_rules(
+        database, subreddit, action_buffer_builder, config, action_log
+    )
+
+    if sync_tables:
+        info = helpers.fetch_sr_info(subreddit)
+        with database.write() as cursor:
+            helpers.write_sr_tables(cursor, info, action_log.user_ids)
 
-    return browser.Browser(
-        browser_rules, action_buffer_builder.buffers, subreddit, database
+    return Browser(
+        browser_rules,
+        action_buffer_builder.buffers,
+        subreddit,
+        database,
+        action_log,
     )
 
 
-def load_yaml_config(database, subreddit, config_file):
-    """Parse the given file and return a list of Browsers."""
+def load_yaml_config(
+    database, subreddit, config_file, user_ids=None, sync_tables=True
+):
+    """Parse the given file and return a Browser."""
+    with config_file.open() as file:
+        config = yaml.load_all(file, Loader=_YAML_LOADER)
+        return parse_subreddit_config(
+            database, subreddit, config, user_ids, sync_tables
+        )
+
+
+def reload_yaml_config(browser, config_file):
+    """Rebuild the rules of browser from the given file.
+
+    The Browser keeps its action buffers and action log, and the subreddit
+    tables are left alone. If the file is invalid, an exception is raised
+    and the Browser is unchanged.
+
+    """
+    action_buffer_builder = ActionBufferBuilder(
+        browser.subreddit, browser.database, browser.buffers
+    )
     with config_file.open() as file:
-        config = yaml.safe_load_all(file)
-        return parse_subreddit_config(database, subreddit, config)
+        config = list(yaml.load_all(file, Loader=_YAML_LOADER))
+    rules = parse_rules(
+        browser.database,
+        browser.subreddit,
+        action_buffer_builder,
+        config,
+        browser.action_log,
+    )
+    browser.replace_rules(rules, action_buffer_builder.buffers)
+
+
+class ConfigWatcher:
+    """A class to reload Browsers whose configuration files changed.
+
+    Files are polled by modification time and size, at most once every
+    ``interval`` seconds.
+
+    """
+
+    def __init__(self, config_files, interval=5):
+        """Initialize the ConfigWatcher class.
+
+        ``config_files`` maps each Browser to its configuration file.
+
+        """
+        self.config_files = config_files
+        self.interval = interval
+        self._stats = {
+            browser: self._stat(path) for browser, path in config_files.items()
+        }
+        self._last_check = time.monotonic()
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def changed(self):
+        """Return the Browsers whose files changed since the last call."""
+        now = time.monotonic()
+        if now - self._last_check < self.interval:
+            return []
+        self._last_check = now
+        result = []
+        for browser, path in self.config_files.items():
+            stat = self._stat(path)
+            if stat is not None and stat != self._stats[browser]:
+                self._stats[browser] = stat
+                result.append(browser)
+        return result
+
+    def reload(self, browser):
+        """Reload browser from its file, logging any error."""
+        path = self.config_files[browser]
+        try:
+            reload_yaml_config(browser, path)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Failed to reload %s", path)
+        else:
+            logging.info("Reloaded %s", path)
+
+
+def parse_rules(
+    database, subreddit, action_buffer_builder, config, action_log=None
+):
+    """Return a list of Rules, one for each rule configuration."""
+    return [
+        parse_rule_config(
+            database, subreddit, action_buffer_builder, rule_config, action_log
+        )
+        for rule_config in config
+    ]
 
 
-def parse_rule_config(database, subreddit, action_buffer_builder, rule_config):
+def parse_rule_config(
+    database, subreddit, action_buffer_builder, rule_config, action_log=None
+):
     """Return a Rule corresponding to rule_config."""
     target_types = [_TARGET_MAP[x] for x in rule_config["trigger"]["types"]]
     action_configs = [_ActionConfig(x) for x in rule_config.get("actions", [])]
@@ -133,4 +254,5 @@ def parse_rule_config(database, subreddit, action_buffer_builder, rule_config):
         action_details=rule_config["info"].get("details"),
         database=database,
         subreddit=subreddit,
+        action_log=action_log,
     )
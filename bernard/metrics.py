@@ -0,0 +1,267 @@
+"""Metrics on the moderation loop, in the Prometheus text format.
+
+The metrics below are updated by the rest of the bot and collected in
+``REGISTRY``. They can be served over HTTP with ``serve``, or written to a
+file at regular intervals with ``dump_every``.
+
+"""
+import os
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import prawcore
+
+
+class Registry:
+    """A collection of metrics."""
+
+    def __init__(self):
+        """Initialize the Registry class."""
+        self.metrics = []
+
+    def register(self, metric):
+        """Add metric to the registry and return it."""
+        self.metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        """Return every metric in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.exposition())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the exposition to path, replacing the file atomically."""
+        temporary = "{}.tmp".format(path)
+        with open(temporary, "w") as file:
+            file.write(self.exposition())
+        os.replace(temporary, path)
+
+
+REGISTRY = Registry()
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+class Metric:
+    """Base class for metrics, with values per combination of labels."""
+
+    TYPE = None
+
+    def __init__(self, name, documentation, labels=(), registry=REGISTRY):
+        """Initialize the Metric class."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _samples(self, key, value):
+        yield self.name, key, value
+
+    def _format_labels(self, key):
+        if not key:
+            return ""
+        pairs = ",".join(
+            '{}="{}"'.format(label, _escape(value))
+            for label, value in zip(self.labels, key)
+        )
+        return "{" + pairs + "}"
+
+    def value(self, **labels):
+        """Return the current value for labels."""
+        return self._values.get(self._key(labels))
+
+    def exposition(self):
+        """Return the lines describing this metric."""
+        lines = [
+            "# HELP {} {}".format(self.name, self.documentation),
+            "# TYPE {} {}".format(self.name, self.TYPE),
+        ]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            for name, sample_key, sample in self._samples(key, value):
+                lines.append(
+                    "{}{} {}".format(
+                        name, self._format_labels(sample_key), sample
+                    )
+                )
+        return lines
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Increase the value for labels by amount."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that can go up and down."""
+
+    TYPE = "gauge"
+
+    def set(self, value, **labels):
+        """Set the value for labels."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Summary(Metric):
+    """The count and sum of observed values, such as durations."""
+
+    TYPE = "summary"
+
+    def observe(self, value, **labels):
+        """Record an observation for labels."""
+        key = self._key(labels)
+        with self._lock:
+            count, total = self._values.get(key, (0, 0))
+            self._values[key] = (count + 1, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the time taken by the body of the with statement."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key, value):
+        count, total = value
+        yield self.name + "_count", key, count
+        yield self.name + "_sum", key, total
+
+
+CYCLE_SECONDS = Summary(
+    "bernard_cycle_seconds", "Time taken by polling cycles.", ["subreddit"]
+)
+REPORTS_FETCHED = Counter(
+    "bernard_reports_fetched_total",
+    "Mod reports read from the modqueue.",
+    ["subreddit"],
+)
+RULES_MATCHED = Counter(
+    "bernard_rules_matched_total",
+    "Reports that matched a rule, including ones already acted on.",
+    ["subreddit", "rule"],
+)
+ACTIONS = Counter(
+    "bernard_actions_total",
+    "Actions carried out, by actor class.",
+    ["subreddit", "actor"],
+)
+BUFFER_DEPTH = Gauge(
+    "bernard_buffer_depth",
+    "Items waiting in action buffers at the end of the last cycle.",
+    ["subreddit", "buffer"],
+)
+API_REQUESTS = Counter(
+    "bernard_api_requests_total",
+    "Requests made to reddit, by method and status code.",
+    ["method", "status"],
+)
+API_ERRORS = Counter(
+    "bernard_api_errors_total",
+    "Requests to reddit that failed or returned an error status.",
+    ["method"],
+)
+DB_COMMIT_SECONDS = Summary(
+    "bernard_db_commit_seconds", "Time taken by database commits."
+)
+
+
+class InstrumentedRequestor(prawcore.Requestor):
+    """A Requestor that counts requests and errors.
+
+    Pass it to Reddit as ``requestor_class``.
+
+    """
+
+    def request(self, *args, **kwargs):
+        """Issue the request, recording its outcome."""
+        method = args[0] if args else kwargs.get("method", "")
+        try:
+            response = super().request(*args, **kwargs)
+        except prawcore.RequestException:
+            API_REQUESTS.inc(method=method, status="error")
+            API_ERRORS.inc(method=method)
+            raise
+        API_REQUESTS.inc(method=method, status=response.status_code)
+        if response.status_code >= 400:
+            API_ERRORS.inc(method=method)
+        return response
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Respond with the exposition."""
+        body = self.registry.exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Don't log every scrape to stderr."""
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(port, address="127.0.0.1", registry=REGISTRY):
+    """Serve registry over HTTP from a background thread.
+
+    Return the server, whose ``shutdown`` method stops it.
+
+    """
+    handler = type("Handler", (_Handler,), {"registry": registry})
+    server = _Server((address, port), handler)
+    thread = threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True
+    )
+    thread.start()
+    return server
+
+
+def dump_every(path, interval=15, registry=REGISTRY):
+    """Write registry to path every interval seconds, from a daemon thread.
+
+    Return an Event that stops the thread when set.
+
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            registry.write(path)
+
+    threading.Thread(target=run, name="metrics", daemon=True).start()
+    return stop
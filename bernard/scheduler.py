@@ -0,0 +1,257 @@
+"""Provide the Scheduler and AdaptiveInterval classes."""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import prawcore
+
+from . import helpers, metrics
+
+
+class AdaptiveInterval:
+    """A polling interval that adapts to a Browser's activity.
+
+    The interval drops to the minimum after a cycle that acted on reports,
+    and grows by the backoff factor, up to the maximum, after idle or failed
+    cycles.
+
+    """
+
+    def __init__(self, minimum=10, maximum=60, backoff=2):
+        """Initialize the AdaptiveInterval class."""
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.current = minimum
+
+    def update(self, acted, failed=False):
+        """Return the next interval, given the outcome of a cycle."""
+        if acted and not failed:
+            self.current = self.minimum
+        else:
+            self.current = min(self.current * self.backoff, self.maximum)
+        return self.current
+
+
+class Scheduler:
+    """A class to poll each Browser independently of the others.
+
+    Every Browser runs on a shared thread pool, so a slow listing or a long
+    comment tree fetch on one subreddit does not hold up the rest. All
+    Browsers share a single Reddit instance, and therefore a single rate
+    limit budget. If that instance's ``rate_limiter`` is given, intervals are
+    stretched so that the Browsers together stay within the remaining budget.
+
+    If a ``fetcher`` such as MultiredditFetcher is given, the reports of all
+    due Browsers are fetched together before their cycles are started. So
+    that Browsers keep sharing fetches, their next cycles are then scheduled
+    from the fetch rather than from the end of each cycle, and idle Browsers
+    due within ``fetch_window`` seconds are fetched along with those due
+    now. By default, the window is half the minimum interval.
+
+    If a ``watcher`` such as ConfigWatcher is given, Browsers whose
+    configuration changed are reloaded as soon as they are idle.
+
+    Every ``refresh_interval`` seconds, the subreddit and moderator tables
+    of all Browsers are refreshed together, so that their subscriber counts
+    take a single request.
+
+    """
+
+    def __init__(
+        self,
+        browsers,
+        min_interval=10,
+        max_interval=60,
+        backoff=2,
+        refresh_interval=600,
+        max_workers=None,
+        fetcher=None,
+        rate_limiter=None,
+        user_ids=None,
+        watcher=None,
+        fetch_window=None,
+    ):
+        """Initialize the Scheduler class."""
+        self.browsers = browsers
+        self.watcher = watcher
+        self.user_ids = user_ids
+        self.fetcher = fetcher
+        self.fetch_window = (
+            min_interval / 2 if fetch_window is None else fetch_window
+        )
+        self.rate_limiter = rate_limiter
+        self.refresh_interval = refresh_interval
+        self.intervals = {
+            browser: AdaptiveInterval(min_interval, max_interval, backoff)
+            for browser in browsers
+        }
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(browsers), 1)
+        )
+        self._futures = {}
+        self._next_run = {browser: 0 for browser in browsers}
+        self._stale = set()
+        self._next_refresh = time.monotonic() + refresh_interval
+        self._lock = threading.Lock()
+        self._reloads = set()
+
+    def _rate_limit_floor(self):
+        """Return the shortest interval the remaining rate limit allows."""
+        limiter = self.rate_limiter
+        if (
+            limiter is None
+            or limiter.remaining is None
+            or limiter.reset_timestamp is None
+        ):
+            return 0
+        seconds_to_reset = max(limiter.reset_timestamp - time.time(), 0)
+        if limiter.remaining <= 0:
+            return seconds_to_reset
+        return seconds_to_reset * len(self.browsers) / limiter.remaining
+
+    def _schedule(self, browser, acted, failed, started=None):
+        interval = self.intervals[browser].update(acted, failed)
+        interval = max(interval, self._rate_limit_floor())
+        logging.debug("Polling %s in %.1f s", browser.subreddit, interval)
+        if started is None:
+            started = time.monotonic()
+        self._next_run[browser] = started + interval
+
+    def _refresh_tables(self, browsers):
+        # pylint: disable=protected-access
+        reddit = browsers[0].subreddit._reddit
+        try:
+            infos = helpers.fetch_sr_infos(
+                reddit, [browser.subreddit for browser in browsers]
+            )
+        except prawcore.PrawcoreException as exception:
+            logging.error(exception)
+            return
+        by_name = {info.display_name: info for info in infos}
+        databases = {}
+        for browser in browsers:
+            info = by_name.get(str(browser.subreddit))
+            if info is not None:
+                databases.setdefault(browser.database, []).append(info)
+        try:
+            for database, database_infos in databases.items():
+                with database.write() as cursor:
+                    for info in database_infos:
+                        helpers.write_sr_tables(cursor, info, self.user_ids)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Unhandled error refreshing tables")
+
+    def _poll(self, browser, posts=None, started=None):
+        acted, failed = 0, True
+        subreddit = str(browser.subreddit)
+        try:
+            with metrics.CYCLE_SECONDS.time(subreddit=subreddit):
+                acted = browser.run(posts)
+            failed = browser.fetch_failed
+            for buffer in browser.buffers:
+                metrics.BUFFER_DEPTH.set(
+                    buffer.depth(),
+                    subreddit=subreddit,
+                    buffer=type(buffer).__name__,
+                )
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Unhandled error in %s", browser.subreddit)
+        finally:
+            self._schedule(browser, acted, failed, started)
+
+    def _drain(self, browser):
+        try:
+            browser.drain()
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Unhandled error in %s", browser.subreddit)
+
+    def busy(self, browser):
+        """Return True if browser has a cycle in progress."""
+        future = self._futures.get(browser)
+        return future is not None and not future.done()
+
+    def due(self, window=0):
+        """Return the list of idle Browsers due within window seconds."""
+        deadline = time.monotonic() + window
+        return [
+            browser
+            for browser in self.browsers
+            if not self.busy(browser) and self._next_run[browser] <= deadline
+        ]
+
+    def request_refresh(self, browsers):
+        """Refresh the tables of browsers in the background on next tick."""
+        with self._lock:
+            self._stale.update(browsers)
+
+    def _reload(self):
+        self._reloads.update(self.watcher.changed())
+        for browser in list(self._reloads):
+            if not self.busy(browser):
+                self._reloads.discard(browser)
+                self.watcher.reload(browser)
+
+    def tick(self):
+        """Start a cycle for every Browser that is due.
+
+        Idle Browsers that are not due yet work through their backlog.
+
+        """
+        if self.watcher is not None:
+            self._reload()
+
+        now = time.monotonic()
+        if now >= self._next_refresh:
+            self._next_refresh = now + self.refresh_interval
+            self.request_refresh(self.browsers)
+        with self._lock:
+            stale, self._stale = self._stale, set()
+        if stale:
+            self._executor.submit(self._refresh_tables, list(stale))
+
+        due = self.due()
+        if due and self.fetcher is not None:
+            due = self.due(self.fetch_window)
+        for browser in self.browsers:
+            if (
+                browser not in due
+                and not self.busy(browser)
+                and browser.backlog()
+            ):
+                self._futures[browser] = self._executor.submit(
+                    self._drain, browser
+                )
+
+        if self.fetcher is None:
+            for browser in due:
+                self._futures[browser] = self._executor.submit(
+                    self._poll, browser
+                )
+            return
+
+        if not due:
+            return
+        started = time.monotonic()
+        fetched = self.fetcher.fetch(due)
+        for browser in due:
+            if browser in fetched:
+                self._futures[browser] = self._executor.submit(
+                    self._poll, browser, fetched[browser], started
+                )
+            else:
+                self._schedule(browser, acted=0, failed=True, started=started)
+
+    def run(self, resolution=1):
+        """Poll forever, until interrupted."""
+        try:
+            while True:
+                self.tick()
+                time.sleep(resolution)
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Wait for cycles in progress and release the thread pool."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,107 @@
+"""Versioned migrations of the database schema.
+
+Each migration is a SQL script. ``migrate`` applies, in order, those newer
+than the version recorded in the ``schema_version`` table. Databases that
+predate the table are treated as version 0; the first migration only
+creates missing tables, so it is safe to apply to them.
+
+"""
+
+MIGRATIONS = [
+    # 1: Tables from create_tables.sql, including seen_reports
+    """
+    CREATE TABLE IF NOT EXISTS users(
+      id INTEGER PRIMARY KEY,
+      username TEXT UNIQUE
+    );
+
+    CREATE TABLE IF NOT EXISTS modmails(
+      id INTEGER PRIMARY KEY,
+      author INTEGER,
+      time DATETIME,
+      body TEXT,
+      subreddit INTEGER,
+      FOREIGN KEY(author) REFERENCES users(id),
+      FOREIGN KEY(subreddit) REFERENCES subreddits(id)
+    );
+
+    CREATE TABLE IF NOT EXISTS actions(
+      id INTEGER PRIMARY KEY,
+      target_type INTEGER,
+      target_id INTEGER,
+      action_summary TEXT,
+      action_details TEXT,
+      author INTEGER,
+      moderator INTEGER,
+      time DATETIME DEFAULT CURRENT_TIMESTAMP,
+      subreddit INTEGER,
+      FOREIGN KEY(author) REFERENCES users(id),
+      FOREIGN KEY(moderator) REFERENCES users(id),
+      FOREIGN KEY(subreddit) REFERENCES subreddits(id)
+    );
+
+    CREATE TABLE IF NOT EXISTS subreddits(
+      id INTEGER PRIMARY KEY,
+      display_name TEXT UNIQUE,
+      subscribers INT
+    );
+
+    CREATE TABLE IF NOT EXISTS subreddit_moderator(
+      subreddit_id INTEGER,
+      moderator_id INTEGER,
+      PRIMARY KEY(subreddit_id, moderator_id),
+      FOREIGN KEY(subreddit_id) REFERENCES subreddits(id),
+      FOREIGN KEY(moderator_id) REFERENCES users(id)
+    );
+
+    CREATE TABLE IF NOT EXISTS seen_reports(
+      subreddit TEXT,
+      target_type INTEGER,
+      target_id INTEGER,
+      moderator TEXT,
+      command TEXT,
+      PRIMARY KEY(subreddit, target_type, target_id, moderator, command)
+    );
+    """,
+    # 2: Index for Rule._already_acted
+    """
+    CREATE INDEX IF NOT EXISTS actions_target_moderator
+      ON actions(target_type, target_id, moderator);
+    """,
+    # 3: When AutomodWatcherActionBuffer added each list entry
+    """
+    CREATE TABLE IF NOT EXISTS automod_entries(
+      subreddit TEXT,
+      placeholder TEXT,
+      entry TEXT,
+      added REAL,
+      PRIMARY KEY(subreddit, placeholder, entry)
+    );
+    """,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def current_version(database):
+    """Return the schema version of database, or 0 if unversioned."""
+    database.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version(version INTEGER)"
+    )
+    row = database.execute(
+        "SELECT MAX(version) FROM schema_version"
+    ).fetchone()
+    return row[0] or 0
+
+
+def migrate(database):
+    """Apply pending migrations to database and return the new version."""
+    version = current_version(database)
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        # executescript commits first, so each migration is applied in a
+        # transaction of its own
+        database.executescript(
+            "BEGIN; {} INSERT INTO schema_version (version) VALUES({}); "
+            "COMMIT;".format(script, number)
+        )
+    return SCHEMA_VERSION
@@ -0,0 +1,74 @@
+"""Provide the SeenReports class."""
+from . import db, helpers
+
+
+class SeenReports:
+    """A persistent record of the reports a Browser has already processed.
+
+    Reports are identified by target, moderator, and command. The record is
+    kept in memory and written to the ``seen_reports`` table once per cycle.
+
+    """
+
+    def __init__(self, database, subreddit):
+        """Initialize the SeenReports class."""
+        self.database = db.wrap(database)
+        self.subreddit = subreddit
+        self._keys = None
+        self._added = set()
+        self._removed = set()
+        self._subreddit_name = str(subreddit).casefold()
+
+    @staticmethod
+    def key(command, mod, post):
+        """Return the key identifying a report."""
+        target_type, target_id = helpers.deserialize_thing_id(post.fullname)
+        return (target_type, target_id, str(mod), command)
+
+    @property
+    def keys(self):
+        """Return the set of seen keys, loading it on first use."""
+        if self._keys is None:
+            cursor = self.database.reader.execute(
+                "SELECT target_type, target_id, moderator, command "
+                "FROM seen_reports WHERE subreddit = ?",
+                (self._subreddit_name,),
+            )
+            self._keys = {tuple(row) for row in cursor}
+        return self._keys
+
+    def __contains__(self, key):
+        """Return True if the report was already processed."""
+        return key in self.keys
+
+    def add(self, key):
+        """Record a report as processed."""
+        if key not in self.keys:
+            self.keys.add(key)
+            self._added.add(key)
+            self._removed.discard(key)
+
+    def retain(self, current):
+        """Forget reports that are no longer in the modqueue."""
+        stale = self.keys - current
+        self.keys.difference_update(stale)
+        self._added.difference_update(stale)
+        self._removed.update(stale)
+
+    def flush(self, cursor):
+        """Write changes since the last flush with cursor."""
+        if not self._added and not self._removed:
+            return
+        cursor.executemany(
+            "INSERT OR IGNORE INTO seen_reports (subreddit, target_type, "
+            "target_id, moderator, command) VALUES(?,?,?,?,?)",
+            [(self._subreddit_name,) + key for key in self._added],
+        )
+        cursor.executemany(
+            "DELETE FROM seen_reports WHERE subreddit = ? "
+            "AND target_type = ? AND target_id = ? AND moderator = ? "
+            "AND command = ?",
+            [(self._subreddit_name,) + key for key in self._removed],
+        )
+        self._added.clear()
+        self._removed.clear()
@@ -0,0 +1,122 @@
+"""Timing hooks around the stages of a polling cycle.
+
+Code that wants to be traced wraps a stage in ``span``. Each Span is passed
+to every registered hook when it starts and when it ends. Without hooks,
+``span`` does nothing, so tracing costs next to nothing until ``enable`` or
+``add_hook`` is called.
+
+"""
+import json
+import logging
+import time
+
+_HOOKS = []
+
+
+class Span:
+    """A stage of work, with its attributes and timing."""
+
+    __slots__ = ("name", "attributes", "start", "end", "error")
+
+    def __init__(self, name, attributes):
+        """Initialize the Span class."""
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self):
+        """Return the seconds taken by the span, or None if unfinished."""
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def __enter__(self):
+        """Start the span and notify hooks."""
+        self.start = time.perf_counter()
+        for hook in _HOOKS:
+            hook.start(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """End the span and notify hooks."""
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        for hook in _HOOKS:
+            hook.end(self)
+
+
+class _NullSpan:
+    """A context manager that does nothing, used while tracing is off."""
+
+    def __enter__(self):
+        """Do nothing."""
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Do nothing, letting exceptions propagate."""
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Hook:
+    """Base class for tracing hooks."""
+
+    def start(self, span):
+        """Handle a span that has started."""
+
+    def end(self, span):
+        """Handle a span that has ended."""
+
+
+class LogHook(Hook):
+    """A hook that logs each finished span as a line of JSON."""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        """Initialize the LogHook class."""
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def end(self, span):
+        """Log span."""
+        if not self.logger.isEnabledFor(self.level):
+            return
+        record = {"span": span.name, "duration": round(span.duration, 6)}
+        record.update(span.attributes)
+        if span.error is not None:
+            record["error"] = span.error
+        self.logger.log(self.level, json.dumps(record, default=str))
+
+
+def add_hook(hook):
+    """Register hook to receive every span."""
+    _HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    """Stop sending spans to hook."""
+    _HOOKS.remove(hook)
+
+
+def enable(logger=None):
+    """Log every span with a LogHook, and return the hook.
+
+    By default, spans are logged at INFO level to this module's logger.
+
+    """
+    if logger is None:
+        logger = logging.getLogger(__name__)
+        logger.setLevel(logging.INFO)
+    hook = LogHook(logger)
+    add_hook(hook)
+    return hook
+
+
+def span(name, **attributes):
+    """Return a context manager that traces the stage name."""
+    if not _HOOKS:
+        return _NULL_SPAN
+    return Span(name, attributes)
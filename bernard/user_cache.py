@@ -0,0 +1,81 @@
+"""Provide the UserIdCache class."""
+import threading
+from collections import OrderedDict
+
+
+class UserIdCache:
+    """A bounded LRU cache mapping usernames to ids in the users table.
+
+    Missing users are created on lookup. The cache may be shared between
+    threads, but each lookup uses the cursor it is given.
+
+    """
+
+    def __init__(self, maxsize=10000):
+        """Initialize the UserIdCache class."""
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of cached usernames."""
+        return len(self._ids)
+
+    def _store(self, username, user_id):
+        self._ids[username] = user_id
+        self._ids.move_to_end(username)
+        while len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+
+    def clear(self):
+        """Forget all cached ids, e.g. after a rollback."""
+        with self._lock:
+            self._ids.clear()
+
+    def warm(self, cursor):
+        """Fill the cache with the most recently created users."""
+        cursor.execute(
+            "SELECT username, id FROM users ORDER BY id DESC LIMIT ?",
+            (self.maxsize,),
+        )
+        rows = cursor.fetchall()
+        with self._lock:
+            for username, user_id in reversed(rows):
+                self._store(username, user_id)
+
+    def get(self, cursor, username):
+        """Return the id of username, creating the user if needed."""
+        return self.get_many(cursor, [username])[username]
+
+    def get_many(self, cursor, usernames):
+        """Return a dict mapping each of usernames to its id."""
+        result = {}
+        missing = []
+        with self._lock:
+            for username in usernames:
+                user_id = self._ids.get(username)
+                if user_id is None:
+                    missing.append(username)
+                else:
+                    self._ids.move_to_end(username)
+                    result[username] = user_id
+            self.hits += len(result)
+            self.misses += len(missing)
+        if not missing:
+            return result
+
+        cursor.executemany(
+            "INSERT OR IGNORE INTO users (username) VALUES(?)",
+            [(username,) for username in missing],
+        )
+        for username in missing:
+            cursor.execute(
+                "SELECT id FROM users WHERE username = ?", (username,)
+            )
+            result[username] = cursor.fetchone()[0]
+        with self._lock:
+            for username in missing:
+                self._store(username, result[username])
+        return result
@@ -41,3 +41,27 @@ CREATE TABLE subreddit_moderator(
   FOREIGN KEY(subreddit_id) REFERENCES subreddits(id),
   FOREIGN KEY(moderator_id) REFERENCES users(id)
 );
+
+CREATE TABLE seen_reports(
+  subreddit TEXT,
+  target_type INTEGER,
+  target_id INTEGER,
+  moderator TEXT,
+  command TEXT,
+  PRIMARY KEY(subreddit, target_type, target_id, moderator, command)
+);
+
+CREATE INDEX actions_target_moderator
+  ON actions(target_type, target_id, moderator);
+
+CREATE TABLE automod_entries(
+  subreddit TEXT,
+  placeholder TEXT,
+  entry TEXT,
+  added REAL,
+  PRIMARY KEY(subreddit, placeholder, entry)
+);
+
+CREATE TABLE schema_version(version INTEGER);
+
+INSERT INTO schema_version (version) VALUES(3);
@@ -25,7 +25,7 @@ setup(
         "Programming Language :: Python :: 3.6",
     ],
     keywords="reddit moderation",
-    packages=find_packages(exclude=["contrib", "docs", "tests"]),
+    packages=find_packages(exclude=["benchmarks", "contrib", "docs", "tests"]),
     install_requires=[
         "praw >= 5.0, <6.0",
         "prawdditions >= 0.1.2, <0.1.3",
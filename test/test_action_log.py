@@ -0,0 +1,33 @@
+import sqlite3
+import unittest
+
+from bernard.action_log import ActionLog
+
+
+class TestActionLog(unittest.TestCase):
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        with open("create_tables.sql") as f:
+            self.db.executescript(f.read())
+
+    def count_actions(self):
+        return self.db.execute("SELECT COUNT(*) FROM actions").fetchone()[0]
+
+    def test_record_is_deferred(self):
+        log = ActionLog(self.db)
+        log.record(3, 1, "Remove", None, "author", "mod", 5)
+        log.record(3, 2, "Remove", None, "author", "mod", 5)
+        self.assertTrue(log.contains(3, 1, "mod"))
+        self.assertFalse(log.contains(3, 1, "other"))
+        self.assertEqual(0, self.count_actions())
+        log.flush(self.db.cursor())
+        self.assertFalse(log.contains(3, 1, "mod"))
+        self.assertEqual(2, self.count_actions())
+        users = self.db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        self.assertEqual(2, users)
+
+    def test_autoflush(self):
+        log = ActionLog(self.db, autoflush=True)
+        log.record(3, 1, "Remove", None, "author", "mod", 5)
+        self.assertEqual(1, self.count_actions())
+        self.assertFalse(self.db.in_transaction)
@@ -1,4 +1,10 @@
+import json
+import os
 import praw
+import sqlite3
+import threading
+import time
+import unittest.mock
 from .helper import BJOTest
 from bernard import actors
 from bernard.helpers import deserialize_thing_id
@@ -50,6 +56,57 @@ class TestRule(BJOTest):
             self.assertFalse(self.actor._already_acted(post_fullname, "BJO"))
             self.assertEqual("Remove", summary)
 
+    def test_steps_order(self):
+        post = self.r.submission(id="5e7w80")
+        steps = self.actor._steps("TGB", post)
+        self.assertEqual(
+            ["Notifier", "remove", "lock"], [step.name for step in steps]
+        )
+        waves = actors.Rule._waves(steps)
+        self.assertEqual(
+            [["Notifier", "remove"], ["lock"]],
+            [[step.name for step in wave] for wave in waves],
+        )
+
+    def test_circular_order(self):
+        steps = [
+            actors._Step("a", None, ("b",), True),
+            actors._Step("b", None, ("a",), True),
+        ]
+        with self.assertRaises(RuntimeError):
+            actors.Rule._waves(steps)
+
+    def test_concurrent_execution(self):
+        started = []
+        barrier = threading.Barrier(2, timeout=5)
+
+        class Slow(actors.Actor):
+            def action(self, post, mod):
+                barrier.wait()
+                started.append(post)
+
+        class Buffered(actors.Actor):
+            CONCURRENT = False
+            RUNS_AFTER = ("Slow",)
+
+            def action(self, post, mod):
+                started.append(threading.current_thread())
+
+        post = unittest.mock.MagicMock(fullname="t3_5e7w80")
+        post.author.name = "author"
+        self.actor.actors = [
+            Slow(self.subreddit),
+            Slow(self.subreddit),
+            Buffered(self.subreddit),
+        ]
+        self.actor.lock = False
+        self.actor.workers = 2
+        self.actor.subreddit = unittest.mock.MagicMock(fullname="t5_2")
+        self.assertTrue(self.actor.execute("TGB", post))
+        # Both Slow actors had to run at once to pass the barrier
+        self.assertEqual([post, post, threading.current_thread()], started)
+        post.mod.remove.assert_called_once_with()
+
 
 class TestBanner(BJOTest):
     def test_action(self):
@@ -100,11 +157,300 @@ class TestNuker(BJOTest):
         post = self.r.comment(id="dbnpgmz")
         with self.recorder.use_cassette("TestNuker.test_action"):
             actor.action(post, "TGB")
+            self.assertTrue(action_buffer.wait(5))
             child = self.r.comment(id="dbpa8kn")
             child.refresh()
             self.assertIsNotNone(child.banned_by)
 
 
+class TestNukerActionBuffer(BJOTest):
+    def setUp(self):
+        super().setUp()
+        self.buffer = actors.NukerActionBuffer(self.subreddit)
+        self.limiter = self.r._core._rate_limiter
+
+    def test_batch_size_follows_budget(self):
+        self.assertEqual(30, self.buffer.next_batch_size())
+        self.limiter.remaining = 40
+        self.assertEqual(10, self.buffer.next_batch_size())
+        self.limiter.remaining = 0
+        self.assertEqual(1, self.buffer.next_batch_size())
+
+    def test_drain(self):
+        comments = [unittest.mock.MagicMock() for _ in range(5)]
+        for comment in comments:
+            self.buffer.add(comment)
+        self.limiter.remaining = 12
+        self.assertTrue(self.buffer.drain())
+        self.assertEqual(2, self.buffer.backlog())
+        self.assertFalse(self.buffer.drain())
+        self.assertTrue(all(c.mod.remove.called for c in comments))
+        self.assertEqual(0, self.buffer.drain_time())
+
+    def test_expand_streams_more_comments(self):
+        def comment(distinguished=None):
+            mock = unittest.mock.MagicMock(spec=praw.models.Comment)
+            mock.distinguished = distinguished
+            mock.replies = []
+            return mock
+
+        late_reply = comment()
+        more = unittest.mock.MagicMock(spec=praw.models.MoreComments)
+        more.comments.return_value = [late_reply]
+        reply, sticky = comment(), comment(distinguished="moderator")
+        reply.replies = [more]
+        target = comment()
+        target.replies = [reply, sticky]
+
+        self.buffer.expand(target)
+        self.assertTrue(self.buffer.wait(5))
+        self.assertEqual([reply, late_reply], list(self.buffer.actions))
+
+    def test_watch_queues_late_replies(self):
+        root = unittest.mock.MagicMock(spec=praw.models.Comment)
+        root.fullname = "t1_root"
+        root.replies = []
+        late = unittest.mock.MagicMock(
+            fullname="t1_late", parent_id="t1_root", distinguished=None
+        )
+        later = unittest.mock.MagicMock(
+            fullname="t1_later", parent_id="t1_late", distinguished=None
+        )
+        unrelated = unittest.mock.MagicMock(
+            fullname="t1_other", parent_id="t3_post", distinguished=None
+        )
+        self.buffer.subreddit = unittest.mock.MagicMock()
+        self.buffer.subreddit.stream.comments.return_value = iter(
+            [late, unrelated, later, late, None]
+        )
+
+        self.buffer.watch()
+        self.assertFalse(self.buffer.subreddit.stream.comments.called)
+
+        self.buffer.watch_seconds = 3600
+        self.buffer.expand(root)
+        self.assertTrue(self.buffer.wait(5))
+        self.buffer.watch()
+        self.assertEqual([late, later], list(self.buffer.actions))
+
+        self.buffer._roots["t1_root"] = 0
+        self.buffer.watch()
+        self.assertEqual({}, self.buffer._subtree)
+
+
+class TestToolboxNoteAdderActionBuffer(BJOTest):
+    def setUp(self):
+        super().setUp()
+        subreddit = unittest.mock.MagicMock()
+        subreddit._reddit.config.custom = {}
+        self.buffer = actors.ToolboxNoteAdderActionBuffer(subreddit)
+        self.page = self.buffer.subreddit.wiki.__getitem__.return_value
+        self.content = json.dumps(
+            {
+                "ver": 6,
+                "constants": {"users": [], "warnings": []},
+                "blob": self.buffer.compress_blob({}),
+            }
+        )
+
+    def revision(self, revision_id):
+        page = unittest.mock.MagicMock(content_md=self.content)
+        return {"id": revision_id, "page": page}
+
+    def add_note(self, author):
+        self.buffer.add(
+            actors.BufferedNote(author, "abusewarn", "l,x", "TGB", "Hi", 0)
+        )
+
+    def notes_written(self):
+        content = json.loads(self.page.edit.call_args[0][0])
+        return self.buffer.decompress_blob(content["blob"])
+
+    def test_cached_between_own_edits(self):
+        first = self.revision("r1")
+        self.page.revisions.return_value = iter([first])
+        self.add_note("alice")
+        self.buffer.after()
+        self.assertEqual(["alice"], list(self.notes_written()))
+
+        ours = self.revision("r2")
+        ours["page"] = unittest.mock.MagicMock()
+        self.page.revisions.return_value = iter([ours, first])
+        self.add_note("bob")
+        self.buffer.after()
+        self.assertEqual({"alice", "bob"}, set(self.notes_written()))
+        self.page.revisions.assert_called_with(limit=2)
+        self.assertEqual("r2", self.page.edit.call_args[1]["previous"])
+
+        # Someone else edited the page, so it has to be downloaded again
+        self.page.revisions.return_value = iter([self.revision("r4")])
+        self.add_note("carol")
+        self.buffer.after()
+        self.assertEqual(["carol"], list(self.notes_written()))
+
+    def test_compact(self):
+        now = time.time()
+        data = {
+            "[deleted]": {"ns": [{"t": now}]},
+            "alice": {"ns": [{"t": now}, {"t": now - 1}, {"t": now - 2}]},
+            "bob": {"ns": [{"t": now - 10 * 86400}]},
+        }
+        self.buffer.prune_deleted = True
+        self.buffer.max_per_user = 2
+        self.buffer.max_age_days = 5
+        pruned = self.buffer._compact(data)
+        self.assertEqual({"deleted": 1, "old": 1, "excess": 1}, pruned)
+        self.assertEqual({"alice": {"ns": [{"t": now}, {"t": now - 1}]}}, data)
+
+    def test_size_guard(self):
+        data = {
+            str(i): {"ns": [{"t": i, "n": os.urandom(64).hex()}]}
+            for i in range(100)
+        }
+        self.buffer.MAX_PAGE_SIZE = 10000
+        content = self.buffer._serialize({"ver": 6}, data)
+        self.assertLessEqual(len(content), 10000)
+        self.assertIn("99", data)
+        self.assertNotIn("0", data)
+
+    def test_size_guard_tied_times(self):
+        data = {
+            str(i): {"ns": [{"t": 0, "n": os.urandom(64).hex()}]}
+            for i in range(100)
+        }
+        self.buffer.MAX_PAGE_SIZE = 10000
+        self.assertEqual(10, self.buffer._drop_oldest(data))
+        self.assertEqual(90, len(data))
+        content = self.buffer._serialize({"ver": 6}, data)
+        self.assertLessEqual(len(content), 10000)
+        self.assertGreater(len(data), 50)
+
+    def test_no_edit_without_notes(self):
+        self.buffer.after()
+        self.assertFalse(self.page.revisions.called)
+        self.assertFalse(self.page.edit.called)
+
+
+class TestAutomodWatcherActionBuffer(BJOTest):
+    def setUp(self):
+        super().setUp()
+        subreddit = unittest.mock.MagicMock()
+        subreddit._reddit.config.custom = {}
+        self.buffer = actors.AutomodWatcherActionBuffer(subreddit)
+        self.page = self.buffer.subreddit.wiki.__getitem__.return_value
+        page = unittest.mock.MagicMock(
+            content_md="author: [watchlist, Alice, ]"
+        )
+        self.page.revisions.side_effect = lambda limit: iter(
+            [{"id": "r1", "page": page}]
+        )
+
+    def test_extend_skips_duplicates(self):
+        self.buffer.extend("watchlist", ["bob", "Bob"])
+        self.buffer.extend("watchlist", ["BOB", "carol"])
+        self.assertEqual(
+            ["bob", "carol"], self.buffer.placeholder_dict["watchlist"]
+        )
+
+    def test_skips_listed_items(self):
+        self.buffer.extend("watchlist", ["alice", "bob"])
+        self.buffer.after()
+        self.page.edit.assert_called_once_with(
+            "author: [watchlist, Alice, bob, ]", reason=None, previous="r1"
+        )
+        self.assertEqual([], self.buffer.placeholder_dict["watchlist"])
+
+    def test_no_edit_when_nothing_new(self):
+        self.buffer.extend("watchlist", ["ALICE"])
+        self.buffer.after()
+        self.assertFalse(self.page.edit.called)
+        self.assertEqual([], self.buffer.placeholder_dict["watchlist"])
+
+    def test_write_window(self):
+        self.buffer.write_window = 60
+        self.buffer.extend("watchlist", ["bob"])
+        self.buffer.after()
+        self.assertFalse(self.page.revisions.called)
+        self.buffer._pending_since -= 60
+        self.buffer.extend("watchlist", ["carol"])
+        self.buffer.after()
+        self.page.edit.assert_called_once_with(
+            "author: [watchlist, Alice, bob, carol, ]",
+            reason=None,
+            previous="r1",
+        )
+        self.assertIsNone(self.buffer._pending_since)
+
+    def test_max_entries(self):
+        self.buffer.max_entries = 2
+        self.buffer.added_at["watchlist"] = {"dave": 1, "erin": 2}
+        self.page.revisions.side_effect = lambda limit: iter(
+            [
+                {
+                    "id": "r1",
+                    "page": unittest.mock.MagicMock(
+                        content_md="author: [watchlist, Alice, dave, erin]"
+                    ),
+                }
+            ]
+        )
+        self.buffer.extend("watchlist", ["bob"])
+        self.buffer.after()
+        self.page.edit.assert_called_once_with(
+            "author: [watchlist, Alice, bob]", reason=None, previous="r1"
+        )
+        self.assertEqual(["bob"], list(self.buffer.added_at["watchlist"]))
+
+    def test_added_times_stored(self):
+        database = sqlite3.connect(":memory:")
+        with open("create_tables.sql") as f:
+            database.executescript(f.read())
+        self.buffer = actors.AutomodWatcherActionBuffer(
+            self.buffer.subreddit, database
+        )
+        self.buffer.extend("watchlist", ["bob"])
+        self.buffer.after()
+        rows = database.execute(
+            "SELECT placeholder, entry FROM automod_entries"
+        ).fetchall()
+        self.assertEqual([("watchlist", "bob")], rows)
+        reloaded = actors.AutomodWatcherActionBuffer(
+            self.buffer.subreddit, database
+        )
+        self.assertEqual(["bob"], list(reloaded.added_at["watchlist"]))
+
+    def test_expiry(self):
+        self.buffer.max_age_days = 1
+        self.buffer.added_at["watchlist"] = {"alice": time.time() - 86401}
+        self.buffer.after()
+        self.page.edit.assert_called_once_with(
+            "author: [watchlist, ]", reason=None, previous="r1"
+        )
+        self.assertEqual({}, self.buffer.added_at["watchlist"])
+
+        self.page.reset_mock()
+        self.buffer.after()
+        self.assertFalse(self.page.revisions.called)
+
+    def test_missing_placeholder(self):
+        page = unittest.mock.MagicMock(
+            content_md="author:\n  - watchlist\n  - Alice\n"
+        )
+        self.page.revisions.side_effect = lambda limit: iter(
+            [{"id": "r1", "page": page}]
+        )
+        self.buffer.extend("watchlist", ["bob"])
+        self.buffer.extend("elsewhere", ["carol"])
+        with self.assertLogs(level="WARNING") as logs:
+            self.buffer.after()
+        watchlist, elsewhere = logs.output
+        self.assertIn("watchlist", watchlist)
+        self.assertIn("wiki/config/automoderator", watchlist)
+        self.assertIn("elsewhere", elsewhere)
+        self.assertFalse(self.page.edit.called)
+        self.assertEqual(0, self.buffer.depth())
+
+
 class TestAutomodDomainWatcher(BJOTest):
     def test_action(self):
         buffer = actors.AutomodWatcherActionBuffer(self.subreddit)
@@ -0,0 +1,58 @@
+import unittest
+
+from bernard.automod import AutomodConfig
+
+PAGE = """\
+type: comment
+author: [watchlist, Alice, "Bob", ]
+action: report
+---
+domain: [sites, example.com]
+author: [other.watchlist, carol]
+"""
+
+
+class TestAutomodConfig(unittest.TestCase):
+    def test_unchanged(self):
+        config = AutomodConfig(PAGE, ["watchlist", "sites"])
+        self.assertEqual(PAGE, config.render())
+        self.assertIn("watchlist", config)
+        self.assertEqual(2, config.size("watchlist"))
+
+    def test_add_and_discard(self):
+        config = AutomodConfig(PAGE, ["watchlist", "sites"])
+        self.assertFalse(config.add("watchlist", "bob"))
+        self.assertTrue(config.add("watchlist", "dave"))
+        self.assertTrue(config.discard("watchlist", "ALICE"))
+        self.assertFalse(config.discard("watchlist", "watchlist"))
+        self.assertTrue(config.add("sites", "example.org"))
+        self.assertEqual(
+            PAGE.replace('Alice, "Bob", ', '"Bob", dave, ').replace(
+                "example.com", "example.com, example.org"
+            ),
+            config.render(),
+        )
+
+    def test_placeholder_within_item(self):
+        config = AutomodConfig(PAGE, ["watchlist"])
+        self.assertEqual(1, len(config.lists["watchlist"]))
+
+    def test_missing_placeholder(self):
+        config = AutomodConfig(PAGE, ["missing"])
+        self.assertNotIn("missing", config)
+        self.assertEqual(PAGE, config.render())
+
+    def test_block_list_not_supported(self):
+        page = "author:\n  - watchlist\n  - Alice\n"
+        config = AutomodConfig(page, ["watchlist"])
+        self.assertNotIn("watchlist", config)
+        self.assertEqual(page, config.render())
+
+    def test_several_lists(self):
+        page = "author: [watchlist]\n---\nauthor: [watchlist, dave]\n"
+        config = AutomodConfig(page, ["watchlist"])
+        self.assertTrue(config.add("watchlist", "dave"))
+        self.assertEqual(
+            "author: [watchlist, dave]\n---\nauthor: [watchlist, dave]\n",
+            config.render(),
+        )
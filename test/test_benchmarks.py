@@ -0,0 +1,24 @@
+import unittest
+
+from benchmarks import replay
+
+
+class TestReplay(unittest.TestCase):
+    def test_run(self):
+        results = replay.run(
+            reports=20,
+            rules=4,
+            cycles=2,
+            usernotes=10,
+            automod_entries=10,
+            partial=5,
+        )
+        self.assertEqual(2, len(results["cycle_seconds"]))
+        self.assertEqual(40, results["stages"]["already_acted"][0])
+        self.assertEqual(2, results["requests"]["GET /r/{sub}/about/reports"])
+        self.assertEqual(30, results["requests"]["POST /api/remove"])
+        self.assertGreater(results["db_commits"], 0)
+        # The usernotes cache holds across cycles
+        self.assertEqual(1, results["requests"]["GET /r/{sub}/wiki/usernotes"])
+        # One request syncs the tables, and one per cycle hydrates
+        self.assertEqual(3, results["requests"]["GET /api/info"])
@@ -1,4 +1,6 @@
 import praw
+import types
+import unittest
 import unittest.mock
 from .helper import BJOTest
 from bernard import browser, actors
@@ -33,3 +35,108 @@ class TestBrowser(BJOTest):
             "TestBrowser.test_empty_string_report"
         ):
             self.browser.run()
+
+    def test_dispatch(self):
+        other = unittest.mock.MagicMock(
+            commands=["foo", "Bar"], targets=[praw.models.Comment]
+        )
+        dispatch = browser.Browser.build_dispatch([self.rule, other])
+        self.assertEqual(
+            {
+                ("foo", praw.models.Submission): [self.rule],
+                ("foo", praw.models.Comment): [other],
+                ("bar", praw.models.Comment): [other],
+            },
+            dispatch,
+        )
+
+        self.rule.execute = unittest.mock.MagicMock()
+        comment = self.r.comment(id="dbnq46r")
+        self.browser.check_command("FOO", "TGB", comment)
+        self.assertFalse(self.rule.execute.called)
+        submission = self.r.submission(id="5e7x7o")
+        self.browser.check_command("FOO", "TGB", submission)
+        self.rule.execute.assert_called_once_with("TGB", submission)
+
+    def test_hydrate(self):
+        complete = types.SimpleNamespace(
+            fullname="t3_a", author="x", permalink="/a", subreddit="s"
+        )
+        partial = types.SimpleNamespace(fullname="t3_b")
+        loaded = types.SimpleNamespace(
+            fullname="t3_b", author="y", permalink="/b", subreddit="s"
+        )
+        with unittest.mock.patch.object(
+            self.r, "info", return_value=iter([loaded])
+        ) as info:
+            self.browser.hydrate([complete, partial])
+            self.browser.hydrate([complete])
+        info.assert_called_once_with(["t3_b"])
+        self.assertEqual("y", partial.author)
+        self.assertEqual("/b", partial.permalink)
+
+    def reported(self, command):
+        return praw.models.Submission(
+            self.r,
+            _data={
+                "id": "5e7w80",
+                "author": "TGB",
+                "permalink": "/r/bernard/comments/5e7w80/",
+                "subreddit": str(self.subreddit),
+                "mod_reports": [[command, "TGB"]],
+            },
+        )
+
+    def test_seen_reports_are_skipped(self):
+        post = self.reported("foo")
+        self.browser.check_command = unittest.mock.MagicMock()
+        self.browser.run([post])
+        self.browser.run([post])
+        self.assertEqual(1, self.browser.check_command.call_count)
+
+        reloaded = browser.Browser([self.rule], [], self.subreddit, self.db)
+        reloaded.check_command = unittest.mock.MagicMock()
+        reloaded.run([post])
+        self.assertFalse(reloaded.check_command.called)
+
+        # Once cleared from the queue, a report is forgotten
+        self.browser.run([])
+        self.browser.run([post])
+        self.assertEqual(2, self.browser.check_command.call_count)
+
+    def test_unmatched_reports_are_not_seen(self):
+        post = self.reported("bar")
+        self.browser.run([post])
+        self.assertEqual(set(), self.browser.seen.keys)
+
+        rule = unittest.mock.MagicMock(
+            commands=["bar"], targets=[praw.models.Submission]
+        )
+        restarted = browser.Browser([rule], [], self.subreddit, self.db)
+        self.assertEqual(1, restarted.run([post]))
+        rule.execute.assert_called_once_with("TGB", post)
+
+
+class TestMultiredditFetcher(unittest.TestCase):
+    def make_browser(self, name):
+        browser = unittest.mock.MagicMock()
+        browser.subreddit.__str__.return_value = name
+        return browser
+
+    def test_chunks(self):
+        fetcher = browser.MultiredditFetcher(None)
+        fetcher.MAX_NAMES_LENGTH = 10
+        browsers = [self.make_browser(name) for name in ("abcd", "efg", "h")]
+        chunks = list(fetcher.chunks(browsers))
+        self.assertEqual([browsers[:2], browsers[2:]], chunks)
+
+    def test_fetch_routes_by_subreddit(self):
+        first, second = self.make_browser("First"), self.make_browser("Two")
+        post = unittest.mock.MagicMock()
+        post.subreddit.__str__.return_value = "two"
+        reddit = unittest.mock.MagicMock()
+        reddit.subreddit.return_value.mod.reports.return_value = [post]
+        fetcher = browser.MultiredditFetcher(reddit)
+        result = fetcher.fetch([first, second])
+        reddit.subreddit.assert_called_once_with("First+Two")
+        self.assertEqual({first: [], second: [post]}, result)
@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from bernard import db
+
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.database = db.Database.open(
+            os.path.join(directory.name, "bernard.sq3")
+        )
+        with self.database.write() as cursor:
+            cursor.execute("CREATE TABLE t(x INTEGER)")
+
+    def test_wal_mode(self):
+        mode = self.database.writer.execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual("wal", mode[0])
+
+    def test_write_commits(self):
+        with self.database.write() as cursor:
+            cursor.execute("INSERT INTO t VALUES(1)")
+        rows = self.database.reader.execute("SELECT x FROM t").fetchall()
+        self.assertEqual([(1,)], rows)
+
+    def test_write_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with self.database.write() as cursor:
+                cursor.execute("INSERT INTO t VALUES(1)")
+                raise RuntimeError
+        rows = self.database.reader.execute("SELECT x FROM t").fetchall()
+        self.assertEqual([], rows)
+
+    def test_reader_is_read_only_and_per_thread(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            self.database.reader.execute("INSERT INTO t VALUES(1)")
+        readers = []
+        thread = threading.Thread(
+            target=lambda: readers.append(self.database.reader)
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNot(self.database.reader, readers[0])
+
+    def test_wrap(self):
+        connection = sqlite3.connect(":memory:")
+        wrapped = db.wrap(connection)
+        self.assertIs(connection, wrapped.reader)
+        self.assertIs(wrapped, db.wrap(wrapped))
@@ -0,0 +1,55 @@
+import logging
+import unittest.mock
+
+from bernard.discord_notifier import DiscordHandler
+
+
+class TestDiscordHandler(unittest.TestCase):
+    def setUp(self):
+        self.handler = DiscordHandler("https://webhook", interval=0)
+        self.handler.session = unittest.mock.MagicMock()
+        self.post = self.handler.session.post
+        self.post.return_value.status_code = 204
+        self.logger = logging.getLogger("test_discord_notifier")
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+
+    def sent(self):
+        return [
+            call[1]["json"]["content"] for call in self.post.call_args_list
+        ]
+
+    def test_emit_queues(self):
+        self.logger.error("Failed")
+        self.handler.close()
+        self.assertEqual(["Failed"], self.sent())
+
+    def test_batch_counts_repeats(self):
+        batch = [("a", None), ("b", None), ("a", None)]
+        self.assertEqual(["a (x2)\nb"], self.handler._messages(batch))
+
+    def test_batch_split(self):
+        batch = [("a" * 1500, None), ("b" * 1500, None), ("c" * 3000, None)]
+        messages = self.handler._messages(batch)
+        self.assertEqual(["a" * 1500, "b" * 1500, "c" * 2000], messages)
+
+    def test_dropped(self):
+        self.handler.dropped = 3
+        messages = self.handler._messages([("a", None)])
+        self.assertEqual(["a\n(3 more records dropped)"], messages)
+        self.assertEqual(0, self.handler.dropped)
+
+    @unittest.mock.patch("time.sleep")
+    def test_rate_limited(self, sleep):
+        limited = unittest.mock.MagicMock(
+            status_code=429, headers={"Retry-After": "1.5"}
+        )
+        done = unittest.mock.MagicMock(status_code=204)
+        self.post.side_effect = [limited, done]
+        self.handler._send([("a", None)])
+        sleep.assert_called_once_with(1.5)
+        self.assertEqual(["a", "a"], self.sent())
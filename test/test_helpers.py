@@ -0,0 +1,68 @@
+import sqlite3
+import unittest
+import unittest.mock
+
+from bernard import helpers
+
+
+class TestSubredditTables(unittest.TestCase):
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        with open("create_tables.sql") as f:
+            self.db.executescript(f.read())
+
+    def moderators(self):
+        return {
+            row[0]
+            for row in self.db.execute(
+                "SELECT username FROM subreddit_moderator "
+                "JOIN users ON moderator_id = users.id"
+            )
+        }
+
+    def test_write_sr_tables_diff(self):
+        cursor = self.db.cursor()
+        info = helpers.SubredditInfo(5, "sub", 10, ["alice", "bob"])
+        helpers.write_sr_tables(cursor, info)
+        self.assertEqual({"alice", "bob"}, self.moderators())
+
+        cursor = unittest.mock.MagicMock(wraps=self.db.cursor())
+        info = info._replace(subscribers=11, moderators=["bob", "carol"])
+        helpers.write_sr_tables(cursor, info)
+        self.assertEqual({"bob", "carol"}, self.moderators())
+        inserts, deletes = [
+            call[1][1] for call in cursor.executemany.mock_calls[-2:]
+        ]
+        self.assertEqual(1, len(inserts))
+        self.assertEqual(1, len(deletes))
+        subscribers = self.db.execute(
+            "SELECT subscribers FROM subreddits WHERE id = 5"
+        ).fetchone()[0]
+        self.assertEqual(11, subscribers)
+
+    def test_fetch_sr_infos(self):
+        reddit = unittest.mock.MagicMock()
+        subreddits = []
+        for name in ["a", "b", "banned"]:
+            subreddit = unittest.mock.MagicMock()
+            subreddit.__str__.return_value = name
+            subreddit.moderator.return_value = ["mod_" + name]
+            subreddits.append(subreddit)
+        reddit.get.return_value = [
+            unittest.mock.MagicMock(
+                display_name=name.upper(), fullname="t5_" + name, subscribers=3
+            )
+            for name in ["a", "b"]
+        ]
+        with self.assertLogs(level="ERROR"):
+            infos = helpers.fetch_sr_infos(reddit, subreddits)
+        reddit.get.assert_called_once_with(
+            "api/info/", params={"sr_name": "a,b,banned"}
+        )
+        self.assertEqual(
+            [
+                helpers.SubredditInfo(10, "a", 3, ["mod_a"]),
+                helpers.SubredditInfo(11, "b", 3, ["mod_b"]),
+            ],
+            infos,
+        )
@@ -1,8 +1,33 @@
+import os
+import tempfile
+import time
+import unittest.mock
+from pathlib import Path
+
 from .helper import BJOTest
-from bernard.actors import Locker, Notifier
-from bernard.loader import validate_actor_config
+from bernard.action_log import ActionLog
+from bernard.actors import Locker, Notifier, ToolboxNoteAdderActionBuffer
+from bernard.browser import Browser
+from bernard.loader import (
+    ConfigWatcher,
+    load_yaml_config,
+    reload_yaml_config,
+    validate_actor_config,
+)
 from praw.models import Comment, Submission
 
+USERNOTE_CONFIG = """\
+info:
+  name: "Usernote added"
+trigger:
+  commands: [n]
+  types: [post]
+actions:
+  - usernote:
+      text: "Spam"
+      level: "abusewarn"
+"""
+
 
 class TestValidation(BJOTest):
     def setUp(self):
@@ -23,3 +48,76 @@ class TestValidation(BJOTest):
 
     def test_good_target_type(self):
         validate_actor_config(Locker, {}, [Submission])
+
+
+class TestReload(BJOTest):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "bernard-config.yaml"
+        self.path.write_text(USERNOTE_CONFIG)
+        self.buffer = ToolboxNoteAdderActionBuffer(self.subreddit, self.db)
+        self.browser = Browser(
+            [], [self.buffer], self.subreddit, self.db, ActionLog(self.db)
+        )
+
+    def test_load_without_table_sync(self):
+        subreddit = unittest.mock.MagicMock()
+        subreddit._reddit.config.custom = {}
+        browser = load_yaml_config(
+            self.db, subreddit, self.path, sync_tables=False
+        )
+        self.assertEqual(1, len(browser.rules))
+        self.assertFalse(subreddit.moderator.called)
+        count = self.db.execute("SELECT COUNT(*) FROM subreddits").fetchone()
+        self.assertEqual(0, count[0])
+
+    def test_reload_keeps_buffers(self):
+        reload_yaml_config(self.browser, self.path)
+        self.assertEqual(1, len(self.browser.rules))
+        self.assertEqual([self.buffer], self.browser.buffers)
+        self.assertIs(
+            self.buffer, self.browser.rules[0].actors[0].action_buffer
+        )
+        self.assertIn(("n", Submission), self.browser._dispatch)
+
+    def test_reload_dispatches_pending_reports(self):
+        post = Submission(
+            self.r,
+            _data={
+                "id": "5e7w80",
+                "author": "TGB",
+                "permalink": "/r/bernard/comments/5e7w80/",
+                "subreddit": str(self.subreddit),
+                "mod_reports": [["n", "TGB"]],
+            },
+        )
+        self.assertEqual(0, self.browser.run([post]))
+        reload_yaml_config(self.browser, self.path)
+        rule = self.browser.rules[0]
+        rule.execute = unittest.mock.MagicMock()
+        self.assertEqual(1, self.browser.run([post]))
+        rule.execute.assert_called_once_with("TGB", post)
+
+    def test_invalid_config_keeps_rules(self):
+        reload_yaml_config(self.browser, self.path)
+        rules = self.browser.rules
+        self.path.write_text(USERNOTE_CONFIG.replace("usernote", "unknown"))
+        with self.assertRaises(KeyError):
+            reload_yaml_config(self.browser, self.path)
+        self.assertIs(rules, self.browser.rules)
+
+    def test_watcher(self):
+        watcher = ConfigWatcher({self.browser: self.path}, interval=0)
+        self.assertEqual([], watcher.changed())
+        self.path.write_text(USERNOTE_CONFIG + "\n")
+        later = time.time() + 10
+        os.utime(self.path, (later, later))
+        self.assertEqual([self.browser], watcher.changed())
+        self.assertEqual([], watcher.changed())
+        with unittest.mock.patch(
+            "bernard.loader.reload_yaml_config", side_effect=KeyError
+        ):
+            with self.assertLogs(level="ERROR"):
+                watcher.reload(self.browser)
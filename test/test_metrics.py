@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest.mock
+import urllib.request
+
+from bernard import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter(self):
+        counter = metrics.Counter(
+            "test_total", "Help.", ["subreddit"], registry=self.registry
+        )
+        counter.inc(subreddit="a")
+        counter.inc(2, subreddit='b"c')
+        self.assertEqual(1, counter.value(subreddit="a"))
+        self.assertEqual(
+            "# HELP test_total Help.\n"
+            "# TYPE test_total counter\n"
+            'test_total{subreddit="a"} 1\n'
+            'test_total{subreddit="b\\"c"} 2\n',
+            self.registry.exposition(),
+        )
+
+    def test_summary(self):
+        summary = metrics.Summary(
+            "test_seconds", "Help.", registry=self.registry
+        )
+        summary.observe(1.5)
+        with summary.time():
+            pass
+        count, total = summary.value()
+        self.assertEqual(2, count)
+        self.assertGreaterEqual(total, 1.5)
+        self.assertIn("test_seconds_count 2", self.registry.exposition())
+
+    def test_write(self):
+        metrics.Gauge("test_depth", "Help.", registry=self.registry).set(3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.prom")
+            self.registry.write(path)
+            with open(path) as file:
+                self.assertIn("test_depth 3", file.read())
+
+    def test_serve(self):
+        metrics.Gauge("test_depth", "Help.", registry=self.registry).set(3)
+        server = metrics.serve(0, registry=self.registry)
+        try:
+            url = "http://127.0.0.1:{}/".format(server.server_address[1])
+            with urllib.request.urlopen(url) as response:
+                self.assertIn(b"test_depth 3", response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_requestor(self):
+        session = unittest.mock.MagicMock()
+        session.request.return_value.status_code = 503
+        requestor = metrics.InstrumentedRequestor(
+            "test user agent", session=session
+        )
+        before = metrics.API_ERRORS.value(method="GET") or 0
+        requestor.request("GET", "https://oauth.reddit.com/")
+        self.assertEqual(before + 1, metrics.API_ERRORS.value(method="GET"))
+        self.assertLessEqual(
+            1, metrics.API_REQUESTS.value(method="GET", status=503)
+        )
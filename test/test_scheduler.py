@@ -0,0 +1,169 @@
+import threading
+import time
+import unittest
+import unittest.mock
+
+from bernard.scheduler import AdaptiveInterval, Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def test_failure_does_not_block_others(self):
+        failing = unittest.mock.MagicMock()
+        failing.run.side_effect = RuntimeError
+        working = unittest.mock.MagicMock()
+        scheduler = Scheduler(
+            [failing, working], min_interval=0, max_interval=0
+        )
+        with self.assertLogs(level="ERROR"):
+            scheduler.tick()
+            scheduler.shutdown()
+        self.assertTrue(failing.run.called)
+        self.assertTrue(working.run.called)
+
+    def test_slow_browser_is_not_resubmitted(self):
+        release = threading.Event()
+        slow = unittest.mock.MagicMock()
+        slow.run.side_effect = lambda _: release.wait(5)
+        fast = unittest.mock.MagicMock()
+        scheduler = Scheduler([slow, fast], min_interval=0, max_interval=0)
+        scheduler.tick()
+        scheduler._futures[fast].result()
+        self.assertEqual([fast], scheduler.due())
+        scheduler.tick()
+        release.set()
+        scheduler.shutdown()
+        self.assertEqual(1, slow.run.call_count)
+        self.assertEqual(2, fast.run.call_count)
+
+    def test_idle_browser_drains_backlog(self):
+        browser = unittest.mock.MagicMock()
+        browser.backlog.return_value = 0
+        scheduler = Scheduler([browser], min_interval=60)
+        scheduler.tick()
+        scheduler._futures[browser].result()
+        scheduler.tick()
+        self.assertFalse(browser.drain.called)
+        browser.backlog.return_value = 10
+        scheduler.tick()
+        scheduler.shutdown()
+        self.assertTrue(browser.drain.called)
+        self.assertEqual(1, browser.run.call_count)
+
+    def test_reload_waits_for_idle_browser(self):
+        release = threading.Event()
+        browser = unittest.mock.MagicMock()
+        browser.run.side_effect = lambda _: release.wait(5)
+        watcher = unittest.mock.MagicMock()
+        watcher.changed.return_value = []
+        scheduler = Scheduler([browser], min_interval=60, watcher=watcher)
+        scheduler.tick()
+        watcher.changed.return_value = [browser]
+        scheduler.tick()
+        self.assertFalse(watcher.reload.called)
+        release.set()
+        scheduler._futures[browser].result()
+        watcher.changed.return_value = []
+        scheduler.tick()
+        scheduler.shutdown()
+        watcher.reload.assert_called_once_with(browser)
+
+    def test_fetches_stay_combined(self):
+        slow, fast = unittest.mock.MagicMock(), unittest.mock.MagicMock()
+        # test.helper replaces time.sleep, so wait on events instead
+        slow.run.side_effect = lambda _: threading.Event().wait(0.3)
+        fast.run.return_value = 0
+        for browser in slow, fast:
+            browser.backlog.return_value = 0
+        fetcher = unittest.mock.MagicMock()
+        fetcher.fetch.side_effect = lambda due: {b: [] for b in due}
+        scheduler = Scheduler(
+            [slow, fast],
+            min_interval=0.5,
+            max_interval=0.5,
+            fetcher=fetcher,
+            fetch_window=0,
+        )
+        scheduler.tick()
+        for browser in slow, fast:
+            scheduler._futures[browser].result()
+        # Sleep until the first Browser is due; the other one must be too
+        first = min(scheduler._next_run.values())
+        threading.Event().wait(max(first - time.monotonic(), 0))
+        scheduler.tick()
+        scheduler.shutdown()
+        self.assertEqual(2, fetcher.fetch.call_count)
+        self.assertEqual([slow, fast], fetcher.fetch.call_args[0][0])
+
+    def test_fetch_window(self):
+        browsers = [unittest.mock.MagicMock() for _ in range(2)]
+        fetcher = unittest.mock.MagicMock()
+        fetcher.fetch.return_value = {}
+        scheduler = Scheduler(browsers, min_interval=10, fetcher=fetcher)
+        scheduler._next_run[browsers[1]] = time.monotonic() + 4
+        scheduler.tick()
+        scheduler.shutdown()
+        fetcher.fetch.assert_called_once_with(browsers)
+
+    @unittest.mock.patch("bernard.helpers.write_sr_tables")
+    @unittest.mock.patch("bernard.helpers.fetch_sr_infos")
+    def test_tables_refreshed_together(self, fetch_sr_infos, write_sr_tables):
+        browsers = [unittest.mock.MagicMock() for _ in range(2)]
+        database = browsers[0].database
+        for browser, name in zip(browsers, ["a", "b"]):
+            browser.subreddit.__str__.return_value = name
+            browser.database = database
+        fetch_sr_infos.return_value = [
+            unittest.mock.MagicMock(display_name=name) for name in ["a", "b"]
+        ]
+        scheduler = Scheduler(browsers, min_interval=0, refresh_interval=60)
+        # Cycles of different lengths don't split up the refresh
+        browsers[0].run.side_effect = lambda _: threading.Event().wait(0.2)
+        scheduler.tick()
+        scheduler._futures[browsers[1]].result()
+        scheduler.tick()
+        self.assertFalse(fetch_sr_infos.called)
+        scheduler._next_refresh = time.monotonic()
+        scheduler.tick()
+        scheduler.tick()
+        scheduler.shutdown()
+        fetch_sr_infos.assert_called_once()
+        self.assertEqual(
+            {"a", "b"}, {str(s) for s in fetch_sr_infos.call_args[0][1]}
+        )
+        self.assertEqual(1, database.write.call_count)
+        self.assertEqual(2, write_sr_tables.call_count)
+
+    @unittest.mock.patch("bernard.helpers.write_sr_tables")
+    @unittest.mock.patch("bernard.helpers.fetch_sr_infos")
+    def test_request_refresh(self, fetch_sr_infos, write_sr_tables):
+        browser = unittest.mock.MagicMock()
+        fetch_sr_infos.return_value = []
+        scheduler = Scheduler([browser], min_interval=60)
+        scheduler.request_refresh([browser])
+        scheduler.tick()
+        scheduler.shutdown()
+        fetch_sr_infos.assert_called_once_with(
+            browser.subreddit._reddit, [browser.subreddit]
+        )
+
+    def test_rate_limit_floor(self):
+        limiter = unittest.mock.MagicMock(
+            remaining=10, reset_timestamp=time.time() + 100
+        )
+        scheduler = Scheduler(
+            [unittest.mock.MagicMock()] * 2, rate_limiter=limiter
+        )
+        self.assertAlmostEqual(20, scheduler._rate_limit_floor(), places=0)
+        limiter.remaining = 0
+        self.assertAlmostEqual(100, scheduler._rate_limit_floor(), places=0)
+        scheduler.shutdown()
+
+
+class TestAdaptiveInterval(unittest.TestCase):
+    def test_update(self):
+        interval = AdaptiveInterval(minimum=5, maximum=30, backoff=2)
+        self.assertEqual(10, interval.update(acted=0))
+        self.assertEqual(20, interval.update(acted=0))
+        self.assertEqual(30, interval.update(acted=0))
+        self.assertEqual(5, interval.update(acted=2))
+        self.assertEqual(10, interval.update(acted=2, failed=True))
@@ -0,0 +1,57 @@
+import sqlite3
+import unittest
+
+from bernard import schema
+from bernard.actors import Rule
+
+
+def dump_schema(database):
+    return sorted(
+        database.execute(
+            "SELECT type, name FROM sqlite_master "
+            "WHERE name NOT LIKE 'sqlite_%'"
+        )
+    )
+
+
+class TestSchema(unittest.TestCase):
+    def test_new_database(self):
+        db = sqlite3.connect(":memory:")
+        self.assertEqual(schema.SCHEMA_VERSION, schema.migrate(db))
+        self.assertEqual(schema.SCHEMA_VERSION, schema.current_version(db))
+        # Migrating again is a no-op
+        schema.migrate(db)
+        rows = db.execute("SELECT COUNT(*) FROM schema_version").fetchone()
+        self.assertEqual(schema.SCHEMA_VERSION, rows[0])
+
+    def test_matches_create_tables(self):
+        migrated = sqlite3.connect(":memory:")
+        schema.migrate(migrated)
+        created = sqlite3.connect(":memory:")
+        with open("create_tables.sql") as f:
+            created.executescript(f.read())
+        self.assertEqual(dump_schema(created), dump_schema(migrated))
+        self.assertEqual(
+            schema.SCHEMA_VERSION, schema.current_version(created)
+        )
+
+    def test_unversioned_database(self):
+        db = sqlite3.connect(":memory:")
+        db.execute("CREATE TABLE users(id INTEGER PRIMARY KEY, username TEXT)")
+        db.execute("INSERT INTO users (username) VALUES('TGB')")
+        db.commit()
+        schema.migrate(db)
+        self.assertEqual(
+            1, db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        )
+        self.assertIn(("table", "seen_reports"), dump_schema(db))
+
+    def test_already_acted_uses_index(self):
+        db = sqlite3.connect(":memory:")
+        schema.migrate(db)
+        plan = db.execute(
+            "EXPLAIN QUERY PLAN " + Rule.ALREADY_ACTED_QUERY, (3, 1, "TGB")
+        ).fetchall()
+        self.assertTrue(
+            any("actions_target_moderator" in row[-1] for row in plan)
+        )
@@ -0,0 +1,68 @@
+import json
+import logging
+import unittest
+
+from bernard import tracing
+
+
+class RecordingHook(tracing.Hook):
+    def __init__(self):
+        self.events = []
+
+    def start(self, span):
+        self.events.append(("start", span.name))
+
+    def end(self, span):
+        self.events.append(("end", span.name, span.error))
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.hook = RecordingHook()
+        tracing.add_hook(self.hook)
+
+    def tearDown(self):
+        tracing.remove_hook(self.hook)
+
+    def test_span(self):
+        with tracing.span("outer", subreddit="a") as span:
+            with tracing.span("inner"):
+                pass
+        self.assertEqual(
+            [
+                ("start", "outer"),
+                ("start", "inner"),
+                ("end", "inner", None),
+                ("end", "outer", None),
+            ],
+            self.hook.events,
+        )
+        self.assertEqual({"subreddit": "a"}, span.attributes)
+        self.assertGreaterEqual(span.duration, 0)
+
+    def test_error(self):
+        with self.assertRaises(KeyError):
+            with tracing.span("failing"):
+                raise KeyError
+        self.assertEqual(("end", "failing", "KeyError"), self.hook.events[-1])
+
+    def test_disabled(self):
+        tracing.remove_hook(self.hook)
+        with tracing.span("ignored") as span:
+            self.assertIsNone(span)
+        tracing.add_hook(self.hook)
+        self.assertEqual([], self.hook.events)
+
+    def test_log_hook(self):
+        logger = logging.getLogger("test_tracing")
+        hook = tracing.LogHook(logger)
+        tracing.add_hook(hook)
+        try:
+            with self.assertLogs(logger, logging.INFO) as logs:
+                with tracing.span("action", actor="Banner"):
+                    pass
+        finally:
+            tracing.remove_hook(hook)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual("action", record["span"])
+        self.assertEqual("Banner", record["actor"])
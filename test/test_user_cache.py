@@ -0,0 +1,55 @@
+import sqlite3
+import unittest
+
+from bernard import db
+from bernard.action_log import ActionLog
+from bernard.user_cache import UserIdCache
+
+
+class TestUserIdCache(unittest.TestCase):
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        with open("create_tables.sql") as f:
+            self.db.executescript(f.read())
+        self.cur = self.db.cursor()
+
+    def test_get_creates_and_caches(self):
+        cache = UserIdCache()
+        first = cache.get(self.cur, "TGB")
+        self.assertEqual(first, cache.get(self.cur, "TGB"))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        rows = self.db.execute("SELECT id FROM users").fetchall()
+        self.assertEqual([(first,)], rows)
+
+    def test_warm(self):
+        self.cur.executemany(
+            "INSERT INTO users (username) VALUES(?)", [("a",), ("b",), ("c",)]
+        )
+        cache = UserIdCache(maxsize=2)
+        cache.warm(self.cur)
+        self.assertEqual(2, len(cache))
+        cache.get_many(self.cur, ["b", "c"])
+        self.assertEqual((2, 0), (cache.hits, cache.misses))
+
+    def test_eviction(self):
+        cache = UserIdCache(maxsize=2)
+        cache.get_many(self.cur, ["a", "b"])
+        cache.get(self.cur, "a")
+        cache.get(self.cur, "c")
+        cache.get(self.cur, "a")
+        self.assertEqual(2, cache.hits)
+        cache.get(self.cur, "b")
+        self.assertEqual(4, cache.misses)
+
+    def test_rollback_clears(self):
+        database = db.Database(self.db)
+        cache = ActionLog(database).user_ids
+        with self.assertRaises(RuntimeError):
+            with database.write() as cursor:
+                cache.get(cursor, "alice")
+                raise RuntimeError
+        with database.write() as cursor:
+            bob = cache.get(cursor, "bob")
+            alice = cache.get(cursor, "alice")
+        rows = self.db.execute("SELECT username, id FROM users").fetchall()
+        self.assertEqual({("bob", bob), ("alice", alice)}, set(rows))